@@ -1,5 +1,6 @@
 """Da Server Remote Daemon"""
 import logging
+from multiprocessing import Pool
 import os
 from Queue import Queue
 import signal
@@ -12,6 +13,7 @@ from dasdremote.workers import (
     CompletedTorrentMonitor,
     CompletedTorrentPackager
 )
+from dasdremote.workers.completed_torrent_packager import init_package_process
 
 
 class DaServerDaemonRemote(object):
@@ -19,6 +21,16 @@ class DaServerDaemonRemote(object):
     def __init__(self):
         # Process config
         self._complete_torrent_packager_num_threads = settings.DASDREMOTE['COMPLETED_TORRENT_PACKAGER_NUM_THREADS']
+        self._complete_torrent_packager_num_processes = settings.DASDREMOTE.get(
+            'COMPLETED_TORRENT_PACKAGER_NUM_PROCESSES', 0
+        )
+
+        # Packager threads each wait on one process, so fewer threads than
+        # processes would leave processes idle
+        self._complete_torrent_packager_num_threads = max(
+            self._complete_torrent_packager_num_threads,
+            self._complete_torrent_packager_num_processes
+        )
 
         # Set main thread name for log messages
         threading.current_thread().name = 'DaServerDaemonRemote'
@@ -28,6 +40,7 @@ class DaServerDaemonRemote(object):
         self._stop_signal = threading.Event()
         self._workers = []
         self._queue = Queue()
+        self._pool = None
 
     def start(self):
         """Start all managers and threads"""
@@ -35,6 +48,9 @@ class DaServerDaemonRemote(object):
 
         # Start workers
         try:
+            if self._complete_torrent_packager_num_processes > 0:
+                # Package in processes, packager threads wait on results
+                self._pool = Pool(self._complete_torrent_packager_num_processes, init_package_process)
             self._workers.append(
                 CompletedTorrentMonitor(
                     name='CompletedTorrentMonitor',
@@ -47,7 +63,8 @@ class DaServerDaemonRemote(object):
                     CompletedTorrentPackager(
                         name='CompletedTorrentPackager-%d' % i,
                         log=self._log,
-                        torrent_queue=self._queue
+                        torrent_queue=self._queue,
+                        pool=self._pool
                     )
                 )
             for worker in self._workers:
@@ -76,6 +93,9 @@ class DaServerDaemonRemote(object):
             self._queue.put(None)
         for worker in self._workers:
             worker.join()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
 
     def _configure_logging(self):
         self._log = logging.getLogger('DaServerDaemonRemote')
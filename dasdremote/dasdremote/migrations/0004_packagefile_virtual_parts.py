@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-17 17:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dasdremote', '0003_auto_20180413_0443'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='packagefile',
+            name='archive_filename',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='packagefile',
+            name='deleted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='packagefile',
+            name='offset',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-17 17:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dasdremote', '0004_packagefile_virtual_parts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='torrent',
+            name='last_modified',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
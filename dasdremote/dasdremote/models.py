@@ -45,7 +45,7 @@ class DaSDRemoteToken(models.Model):
 class Torrent(models.Model):
     name = models.CharField(max_length=255, unique=True)
     created = models.DateTimeField(auto_now_add=True)
-    last_modified = models.DateTimeField(auto_now_add=True)
+    last_modified = models.DateTimeField(auto_now_add=True, db_index=True)
     package_files_count = models.IntegerField(default=0)
 
     class Meta:
@@ -71,7 +71,15 @@ class PackageFile(models.Model):
     sha256 = models.CharField(max_length=255)
     torrent = models.ForeignKey(Torrent, related_name='package_file_set')
 
+    # Virtual package files are byte ranges of one archive file
+    archive_filename = models.CharField(max_length=255, blank=True, db_index=True)
+    offset = models.BigIntegerField(default=0)
+    deleted = models.BooleanField(default=False)
+
     def __unicode__(self):
         return 'id: %d, filename: "%s", filesize: %d, sha256: %s' % (
             self.id, self.filename, self.filesize, self.sha256
         )
+
+    def is_virtual(self):
+        return bool(self.archive_filename)
@@ -6,6 +6,16 @@ class TorrentPackageSerializer(serializers.Serializer):
     torrent = serializers.RegexField(r'[^/]+')
 
 
+class TorrentPackageBatchSerializer(serializers.Serializer):
+
+    torrents = serializers.ListField(child=serializers.RegexField(r'[^/]+'))
+
+
+class PackageFileBatchSerializer(serializers.Serializer):
+
+    filenames = serializers.ListField(child=serializers.RegexField(r'^[^/]+$'))
+
+
 #
 # Test Serializers
 #
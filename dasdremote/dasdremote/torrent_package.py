@@ -1,9 +1,12 @@
+import contextlib
 import hashlib
 import json
 import os
+import re
 import shutil
 import sys
 import tarfile
+import zlib
 
 import dasdremote.utils as utils
 
@@ -12,9 +15,151 @@ class TorrentDoesNotExistException(Exception):
     pass
 
 
+class SplitFileWriter(object):
+    """Write-only file object that splits its output into part files of
+    `part_size` bytes, named <path>.0000, <path>.0001, ..., and hashes each
+    part as it is written
+    """
+
+    def __init__(self, path, part_size, max_parts=None):
+        self.path = path
+        self.part_size = part_size
+        self.max_parts = max_parts
+
+        # Completed part files
+        self.parts = []
+
+        self._part_num = 0
+        self._out_file = None
+        self._sha256 = None
+        self._bytes_written = 0
+        self._offset = 0
+
+    def _open_part(self):
+        # Verify number of files does not exceed our limits
+        if self.max_parts is not None and self._part_num >= self.max_parts:
+            raise RuntimeError('Exceeded split file count')
+
+        split_file = "%s.%04d" % (self.path, self._part_num)
+        self._out_file = open(split_file, "wb")
+        self._sha256 = hashlib.sha256()
+        self._bytes_written = 0
+
+    def _part_info(self):
+        return {
+            'filename': os.path.basename("%s.%04d" % (self.path, self._part_num)),
+            'filesize': self._bytes_written,
+            'sha256': self._sha256.hexdigest()
+        }
+
+    def _close_part(self):
+        self._out_file.close()
+        self.parts.append(self._part_info())
+        self._out_file = None
+        self._part_num += 1
+
+    def write(self, data):
+        pos = 0
+        while pos < len(data):
+            # Part files are only created once there are bytes to write,
+            # so output that splits evenly does not leave an empty part
+            if self._out_file is None:
+                self._open_part()
+
+            size = min(len(data) - pos, self.part_size - self._bytes_written)
+            chunk = data[pos:pos + size] if size < len(data) else data
+            self._out_file.write(chunk)
+            self._sha256.update(chunk)
+            self._bytes_written += size
+            self._offset += size
+            pos += size
+
+            if self._bytes_written == self.part_size:
+                self._close_part()
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        if self._out_file is not None:
+            self._out_file.flush()
+
+    def close(self):
+        if self._out_file is not None:
+            self._close_part()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class VirtualSplitFileWriter(SplitFileWriter):
+    """SplitFileWriter that writes its output to the single file at `path`.
+    Parts are hashed as they are written and described by their offset in
+    that file instead of being written to part files.
+    """
+
+    def __init__(self, path, part_size, max_parts=None):
+        super(VirtualSplitFileWriter, self).__init__(path, part_size, max_parts)
+        self._archive_file = open(path, "wb")
+        self._part_offset = 0
+
+    def _open_part(self):
+        # Verify number of files does not exceed our limits
+        if self.max_parts is not None and self._part_num >= self.max_parts:
+            raise RuntimeError('Exceeded split file count')
+
+        self._out_file = self._archive_file
+        self._sha256 = hashlib.sha256()
+        self._bytes_written = 0
+        self._part_offset = self._offset
+
+    def _part_info(self):
+        part_info = super(VirtualSplitFileWriter, self)._part_info()
+        part_info['archive_filename'] = os.path.basename(self.path)
+        part_info['offset'] = self._part_offset
+        return part_info
+
+    def _close_part(self):
+        self.parts.append(self._part_info())
+        self._out_file = None
+        self._part_num += 1
+
+    def flush(self):
+        self._archive_file.flush()
+
+    def close(self):
+        super(VirtualSplitFileWriter, self).close()
+        self._archive_file.close()
+
+
 class TorrentPackage(object):
 
-    def __init__(self, source_path, output_dir, min_package_file_size=1, max_package_files=1000):
+    # Compression modes
+    COMPRESSION_NONE = 'none'
+    COMPRESSION_GZIP = 'gzip'
+    COMPRESSION_AUTO = 'auto'
+
+    # Extensions of files that are already compressed
+    COMPRESSED_EXTENSIONS = frozenset([
+        '.7z', '.aac', '.avi', '.bz2', '.flac', '.gif', '.gz', '.jpeg', '.jpg',
+        '.m4a', '.m4v', '.mkv', '.mov', '.mp3', '.mp4', '.ogg', '.png', '.rar',
+        '.tgz', '.webm', '.wmv', '.xz', '.zip'
+    ])
+
+    # Matches multi-volume rar extensions: .r00, .r01, ...
+    RAR_VOLUME_REGEX = re.compile(r'^\.r[0-9]{2,}$')
+
+    # Bytes of uncompressed files to sample for the compressibility probe
+    COMPRESSION_PROBE_BYTES = 4*utils.size.MB
+
+    # Gzip only if the estimated archive is at most this fraction of the source
+    COMPRESSION_MAX_RATIO = 0.9
+
+    def __init__(self, source_path, output_dir, min_package_file_size=1, max_package_files=1000, stream=False,
+                 compress_threads=1, compression=COMPRESSION_GZIP, virtual_parts=False):
         # Absolute path to source file or directory
         self.source_path = os.path.abspath(source_path)
 
@@ -31,8 +176,82 @@ class TorrentPackage(object):
         self.min_package_file_size = min_package_file_size
         self.max_package_files = max_package_files
 
+        # Write archive through a splitting writer instead of to disk
+        self.stream = stream
+
+        # Keep one archive with package files as byte ranges of it
+        self.virtual_parts = virtual_parts
+
+        # Number of threads compressing the archive
+        self.compress_threads = compress_threads
+
+        # Compression mode, resolving auto by sampling the source
+        if compression == self.COMPRESSION_AUTO:
+            compression = self.get_auto_compression()
+        if compression not in (self.COMPRESSION_NONE, self.COMPRESSION_GZIP):
+            raise ValueError("Invalid compression: %s" % compression)
+        self.compression = compression
+
         # Absolute path to archive file
-        self.archive_path = os.path.join(self.output_dir, "%s.tgz" % self.source_name)
+        extension = "tgz" if self.compression == self.COMPRESSION_GZIP else "tar"
+        self.archive_path = os.path.join(self.output_dir, "%s.%s" % (self.source_name, extension))
+
+    def is_compressed_file(self, path):
+        """Determine if file extension is one of a compressed format"""
+        extension = os.path.splitext(path)[1].lower()
+        return extension in self.COMPRESSED_EXTENSIONS or self.RAR_VOLUME_REGEX.match(extension) is not None
+
+    def get_source_files(self):
+        """Return list of regular files in source"""
+        if os.path.isfile(self.source_path):
+            return [self.source_path]
+
+        source_files = []
+        for root, dirs, files in os.walk(self.source_path):
+            for f in files:
+                path = os.path.join(root, f)
+                if os.path.isfile(path) and not os.path.islink(path):
+                    source_files.append(path)
+        return source_files
+
+    def get_auto_compression(self):
+        """Return compression mode that pays off for the source. Files with
+        compressed extensions are counted as incompressible, the rest are
+        estimated by compressing a sample from the start of the largest
+        ones.
+        """
+        compressed_size = 0
+        uncompressed_files = []
+        for path in self.get_source_files():
+            if self.is_compressed_file(path):
+                compressed_size += os.path.getsize(path)
+            else:
+                uncompressed_files.append((os.path.getsize(path), path))
+        uncompressed_size = sum(size for size, _ in uncompressed_files)
+
+        total_size = compressed_size + uncompressed_size
+        if total_size == 0:
+            return self.COMPRESSION_GZIP
+
+        # Probe compressibility of uncompressed files, largest first
+        ratio = 1.0
+        if uncompressed_size > 0:
+            sample_size = 0
+            deflated_size = 0
+            for size, path in sorted(uncompressed_files, reverse=True):
+                if sample_size >= self.COMPRESSION_PROBE_BYTES:
+                    break
+                with open(path, 'rb') as f:
+                    sample = f.read(self.COMPRESSION_PROBE_BYTES - sample_size)
+                sample_size += len(sample)
+                deflated_size += len(zlib.compress(sample, 1))
+            if sample_size > 0:
+                ratio = float(deflated_size) / sample_size
+
+        estimated_size = compressed_size + uncompressed_size * ratio
+        if estimated_size / total_size > self.COMPRESSION_MAX_RATIO:
+            return self.COMPRESSION_NONE
+        return self.COMPRESSION_GZIP
 
     def get_package_file_size(self, total_archive_size):
         if total_archive_size / self.min_package_file_size > self.max_package_files:
@@ -41,6 +260,35 @@ class TorrentPackage(object):
             package_file_size = self.min_package_file_size
         return package_file_size
 
+    def get_archive_size_bound(self):
+        """Return upper bound of the archive size, computed from the source
+        files before the archive is written
+        """
+        block = tarfile.BLOCKSIZE
+        paths = [(self.source_path, self.source_name)]
+        for root, dirs, files in os.walk(self.source_path):
+            for name in dirs + files:
+                path = os.path.join(root, name)
+                arcname = os.path.join(self.source_name, os.path.relpath(path, self.source_path))
+                paths.append((path, arcname))
+
+        tar_size = 0
+        for path, arcname in paths:
+            # Header block, long name blocks and content rounded up to blocks
+            tar_size += block + len(arcname) + 2 * block
+            if os.path.isfile(path) and not os.path.islink(path):
+                tar_size += os.path.getsize(path) + block
+
+        # End of archive blocks and padding to the record size
+        tar_size += tarfile.RECORDSIZE + 2 * block
+
+        if self.compression == self.COMPRESSION_NONE:
+            return tar_size
+
+        # Worst case deflate expansion plus gzip header and trailer
+        return tar_size + (tar_size >> 12) + (tar_size >> 14) + (tar_size >> 25) + \
+            len(self.archive_path) + 64
+
     def set_permissions(self):
         # Set permissions on source path
         if os.path.isdir(self.source_path):
@@ -54,11 +302,29 @@ class TorrentPackage(object):
             for f in files:
                 os.chmod(os.path.join(root, f), 0o664)
 
+    @contextlib.contextmanager
+    def open_archive(self, fileobj):
+        """Open tar file writing to `fileobj`, gzip compressed on multiple
+        threads if configured
+        """
+        if self.compression == self.COMPRESSION_NONE:
+            with tarfile.open(mode="w|", fileobj=fileobj) as tf:
+                yield tf
+        elif self.compress_threads > 1:
+            with utils.pgzip.ParallelGzipWriter(fileobj, self.compress_threads) as gz:
+                with tarfile.open(mode="w|", fileobj=gz) as tf:
+                    yield tf
+        else:
+            # Name is only used for the gzip header
+            with tarfile.open(self.archive_path, "w:gz", fileobj=fileobj) as tf:
+                yield tf
+
     def archive_source(self):
         # Create archive file
-        with tarfile.open(self.archive_path, "w:gz") as tf:
-            # Add source file or directory to archive with relative paths
-            tf.add(self.source_path, arcname=self.source_name)
+        with open(self.archive_path, "wb") as out_file:
+            with self.open_archive(out_file) as tf:
+                # Add source file or directory to archive with relative paths
+                tf.add(self.source_path, arcname=self.source_name)
 
         return self.archive_path
 
@@ -116,6 +382,23 @@ class TorrentPackage(object):
                 if part_num > self.max_package_files:
                     raise RuntimeError('Exceeded split file count')
 
+    def stream_archive(self):
+        """Archive source through a SplitFileWriter so package files are
+        written and hashed in a single pass. Package files are either
+        written to part files without a full archive on disk, or kept as
+        byte ranges of the archive with virtual parts.
+        """
+        # Split at the size computed from an upper bound of the archive size
+        package_file_size = self.get_package_file_size(self.get_archive_size_bound())
+
+        writer_class = VirtualSplitFileWriter if self.virtual_parts else SplitFileWriter
+        with writer_class(self.archive_path, package_file_size, self.max_package_files) as out_file:
+            with self.open_archive(out_file) as tf:
+                # Add source file or directory to archive with relative paths
+                tf.add(self.source_path, arcname=self.source_name)
+
+        return out_file.parts
+
     def remove_archive(self):
         try:
             os.remove(self.archive_path)
@@ -124,6 +407,11 @@ class TorrentPackage(object):
 
     def create_package(self):
         self.set_permissions()
+        if self.stream or self.virtual_parts:
+            for package_file in self.stream_archive():
+                yield package_file
+            return
+
         self.archive_source()
         for package_file in self.split_archive():
             yield package_file
@@ -8,8 +8,10 @@ from . import views
 
 urlpatterns = [
     url(r'^auth/api-token-auth/$', views.obtain_auth_token),
+    url(r'^download/$', views.DaSDRemoteDownloadViews.as_view()),
     url(r'^download/(?P<filename>[^/]+)/$', views.DaSDRemoteDownloadViews.as_view()),
     url(r'^torrents/$', views.DaSDRemoteTorrentViews.as_view()),
+    url(r'^torrents/wait/$', views.DaSDRemoteTorrentWaitViews.as_view()),
     url(r'^admin/', admin.site.urls),
 
     #url(r'^auth/login/$', auth_views.login),    # Don't think this is being used
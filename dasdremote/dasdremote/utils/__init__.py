@@ -3,4 +3,6 @@ import dasdremote.utils.daemon_command
 import dasdremote.utils.fs
 import dasdremote.utils.hash
 import dasdremote.utils.initd
+import dasdremote.utils.notify
+import dasdremote.utils.pgzip
 import dasdremote.utils.size
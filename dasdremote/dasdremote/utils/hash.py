@@ -1,22 +1,27 @@
 import hashlib
 
 
-def compute_md5(path):
-    md5 = hashlib.md5()
-    with open(path, 'rb') as f:
-        while True:
-            chunk = f.read(16*1024)
-            if not chunk:
-                break
-            md5.update(chunk)
-    return md5.hexdigest()
+DEFAULT_BLOCK_SIZE = 1024*1024
+
+
+def compute_md5(path, block_size=DEFAULT_BLOCK_SIZE):
+    return compute_digests(path, ('md5',), block_size)['md5']
+
+def compute_sha256(path, block_size=DEFAULT_BLOCK_SIZE):
+    return compute_digests(path, ('sha256',), block_size)['sha256']
 
-def compute_sha256(path):
-    sha256 = hashlib.sha256()
+def compute_digests(path, algorithms=('md5', 'sha256'), block_size=DEFAULT_BLOCK_SIZE):
+    """Compute several hashes of file in one pass, reading into a reused
+    buffer. Return dict of hex digests keyed by algorithm name.
+    """
+    hash_objs = [hashlib.new(algorithm) for algorithm in algorithms]
+    buf = bytearray(block_size)
     with open(path, 'rb') as f:
         while True:
-            chunk = f.read(16*1024)
-            if not chunk:
+            num_bytes = f.readinto(buf)
+            if not num_bytes:
                 break
-            sha256.update(chunk)
-    return sha256.hexdigest()
+            chunk = buf if num_bytes == block_size else buf[:num_bytes]
+            for hash_obj in hash_objs:
+                hash_obj.update(chunk)
+    return dict(zip(algorithms, [hash_obj.hexdigest() for hash_obj in hash_objs]))
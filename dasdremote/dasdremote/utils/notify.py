@@ -0,0 +1,44 @@
+"""Cross-process notification utility module"""
+import os
+
+from inotify_simple import INotify, flags
+
+import dasdremote.utils.fs
+
+
+def touch(path):
+    """Create file if necessary and update its modification time"""
+    dasdremote.utils.fs.mkdir_p(os.path.dirname(path))
+    with open(path, 'a'):
+        os.utime(path, None)
+
+
+def notify(path):
+    """Wake up every Notifier waiting on `path`"""
+    touch(path)
+
+
+class Notifier(object):
+    """Wait for notifications sent to the file at `path` by other threads or
+    processes. Notifications are only seen while the context is entered.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._inotify = None
+
+    def wait(self, timeout_sec):
+        """Wait until notified or the timeout expires. Return True if
+        notified.
+        """
+        return len(self._inotify.read(timeout=int(timeout_sec * 1000))) > 0
+
+    def __enter__(self):
+        touch(self.path)
+        self._inotify = INotify()
+        self._inotify.add_watch(self.path, flags.ATTRIB | flags.CLOSE_WRITE)
+        return self
+
+    def __exit__(self, *args):
+        self._inotify.close()
+        self._inotify = None
@@ -0,0 +1,95 @@
+"""Parallel gzip compression utility module"""
+import collections
+from multiprocessing.pool import ThreadPool
+import struct
+import time
+import zlib
+
+
+def compress_block(data, compresslevel):
+    """Compress `data` as raw deflate blocks ending on a byte boundary, so
+    compressed blocks can be concatenated into one deflate stream
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+class ParallelGzipWriter(object):
+    """Write-only file object that gzip compresses its output to `fileobj`
+    on `num_threads` threads, pigz-style. Input is cut into blocks of
+    `block_size` bytes which are compressed independently and written in
+    order as a single gzip member, readable by any gzip reader.
+    """
+
+    def __init__(self, fileobj, num_threads, block_size=1024*1024, compresslevel=9):
+        self.fileobj = fileobj
+        self.num_threads = num_threads
+        self.block_size = block_size
+        self.compresslevel = compresslevel
+
+        self._pool = ThreadPool(num_threads)
+        self._pending = collections.deque()
+        self._buffer = []
+        self._buffer_size = 0
+        self._crc = 0
+        self._size = 0
+        self._closed = False
+
+        self._write_header()
+
+    def _write_header(self):
+        # Magic, deflate, no flags, mtime, no extra flags, unknown OS
+        self.fileobj.write(b'\x1f\x8b\x08\x00' + struct.pack('<L', int(time.time())) + b'\x00\xff')
+
+    def _submit_block(self):
+        block = b''.join(self._buffer)
+        self._buffer = []
+        self._buffer_size = 0
+        self._pending.append(self._pool.apply_async(compress_block, (block, self.compresslevel)))
+
+        # Bound memory by writing out blocks once every thread has work
+        while len(self._pending) > 2 * self.num_threads:
+            self.fileobj.write(self._pending.popleft().get())
+
+    def write(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._buffer.append(data)
+        self._buffer_size += len(data)
+        if self._buffer_size >= self.block_size:
+            self._submit_block()
+
+    def tell(self):
+        return self._size
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+
+        try:
+            if self._buffer_size > 0:
+                self._submit_block()
+            while self._pending:
+                self.fileobj.write(self._pending.popleft().get())
+        finally:
+            self._pool.terminate()
+
+        # Empty final deflate block and trailer
+        self.fileobj.write(zlib.compressobj(
+            self.compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS).flush(zlib.Z_FINISH))
+        self.fileobj.write(struct.pack('<LL', self._crc & 0xffffffff, self._size & 0xffffffff))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Do not finish a stream that failed part way
+            self._closed = True
+            self._pool.terminate()
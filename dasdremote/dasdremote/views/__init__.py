@@ -1,7 +1,7 @@
 from .auth_token import obtain_auth_token
 from .download import DaSDRemoteDownloadViews
 from .test import *
-from .torrents import DaSDRemoteTorrentViews
+from .torrents import DaSDRemoteTorrentViews, DaSDRemoteTorrentWaitViews
 
 from .index import *
 from .debug import *
@@ -1,15 +1,37 @@
 import os
+import re
 
 from django.conf import settings
 from django.http import (
     HttpResponse,
-    HttpResponseNotFound
+    HttpResponseBadRequest,
+    HttpResponseNotFound,
+    JsonResponse,
+    StreamingHttpResponse
 )
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.renderers import JSONRenderer
 from rest_framework.views import APIView
 
 from dasdremote.authentication import DaSDRemoteTokenAuthentication
+from dasdremote.models import PackageFile
+from dasdremote.serializers import PackageFileBatchSerializer
+
+
+# Matches single byte ranges: bytes=<start>-[<stop>]
+RANGE_REGEX = re.compile(r'^bytes=([0-9]+)-([0-9]*)$')
+
+
+def read_file_range(path, offset, length, chunk_size=64*1024):
+    """Yield `length` bytes of file at `path` starting at `offset`"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
 
 
 class DaSDRemoteDownloadViews(APIView):
@@ -17,21 +39,123 @@ class DaSDRemoteDownloadViews(APIView):
     permission_classes = (IsAuthenticated,)
     renderer_classes = (JSONRenderer,)
 
-    def get(self, request, filename):
+    def get(self, request, filename=None):
+        if filename is None:
+            return HttpResponseNotFound()
+
         # Verify file exists
         filepath = os.path.join(settings.DASDREMOTE['PACKAGED_TORRENTS_DIR'], filename)
         if not os.path.isfile(filepath):
-            return HttpResponseNotFound()
+            return self._get_virtual_package_file(request, filename)
 
         response = HttpResponse()
         response['Content-Disposition'] = 'attachment; filename=%s' % filename
         response['X-Accel-Redirect'] = os.path.join(settings.DASDREMOTE['PACKAGED_TORRENTS_INTERNAL_URL'], filename)
         return response
 
-    def delete(self, request, filename):
+    def delete(self, request, filename=None):
+        if filename is None:
+            return self._delete_package_files(request)
+
         # Delete torrent package file
         try:
             os.remove(os.path.join(settings.DASDREMOTE['PACKAGED_TORRENTS_DIR'], filename))
             return HttpResponse()
         except:
-            return HttpResponseNotFound()
\ No newline at end of file
+            if not self._delete_virtual_package_files([filename]):
+                return HttpResponseNotFound()
+            return HttpResponse()
+
+    def _delete_package_files(self, request):
+        """Delete many package files in one request. Return the filenames
+        that were deleted and the ones that did not exist.
+        """
+        # Validate input
+        serializer = PackageFileBatchSerializer(data=request.data)
+        if not serializer.is_valid(raise_exception=False):
+            return HttpResponseBadRequest()
+
+        deleted = []
+        not_found = []
+        for filename in serializer.data['filenames']:
+            try:
+                os.remove(os.path.join(settings.DASDREMOTE['PACKAGED_TORRENTS_DIR'], filename))
+                deleted.append(filename)
+            except OSError:
+                not_found.append(filename)
+
+        # Remaining filenames can be virtual package files
+        virtual_deleted = self._delete_virtual_package_files(not_found)
+        deleted.extend(virtual_deleted)
+        missing = sorted(set(not_found) - set(virtual_deleted))
+
+        return JsonResponse({
+            'deleted': deleted,
+            'missing': missing
+        })
+
+    def _get_virtual_package_file(self, request, filename):
+        """Serve package file as a byte range of its archive. The range is
+        served directly, since nginx would apply a requested range to the
+        whole archive.
+        """
+        try:
+            package_file = PackageFile.objects.get(filename=filename, deleted=False)
+        except PackageFile.DoesNotExist:
+            return HttpResponseNotFound()
+        archive_path = os.path.join(settings.DASDREMOTE['PACKAGED_TORRENTS_DIR'], package_file.archive_filename)
+        if not package_file.is_virtual() or not os.path.isfile(archive_path):
+            return HttpResponseNotFound()
+
+        # Apply requested range within package file
+        start, stop = 0, package_file.filesize - 1
+        status = 200
+        range_header = request.META.get('HTTP_RANGE')
+        if range_header:
+            match = RANGE_REGEX.match(range_header)
+            if match is not None:
+                start = int(match.group(1))
+                if match.group(2):
+                    stop = int(match.group(2))
+            if match is None or start >= package_file.filesize or stop < start:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */%d' % package_file.filesize
+                return response
+            stop = min(stop, package_file.filesize - 1)
+            status = 206
+
+        length = stop - start + 1
+        response = StreamingHttpResponse(
+            read_file_range(archive_path, package_file.offset + start, length),
+            status=status, content_type='application/octet-stream'
+        )
+        response['Content-Disposition'] = 'attachment; filename=%s' % filename
+        response['Content-Length'] = str(length)
+        response['Accept-Ranges'] = 'bytes'
+        if status == 206:
+            response['Content-Range'] = 'bytes %d-%d/%d' % (start, stop, package_file.filesize)
+        return response
+
+    def _delete_virtual_package_files(self, filenames):
+        """Mark virtual package files deleted and remove each archive once
+        every package file in it has been deleted. Return filenames that
+        were deleted.
+        """
+        package_files = PackageFile.objects\
+            .filter(filename__in=filenames, deleted=False)\
+            .exclude(archive_filename='')
+        deleted = list(package_files.values_list('filename', 'archive_filename'))
+        if not deleted:
+            return []
+        PackageFile.objects.filter(filename__in=[filename for filename, _ in deleted]).update(deleted=True)
+
+        archive_filenames = set(archive_filename for _, archive_filename in deleted)
+        remaining = PackageFile.objects\
+            .filter(archive_filename__in=archive_filenames, deleted=False)\
+            .values_list('archive_filename', flat=True)
+        for archive_filename in archive_filenames - set(remaining):
+            try:
+                os.remove(os.path.join(settings.DASDREMOTE['PACKAGED_TORRENTS_DIR'], archive_filename))
+            except OSError:
+                pass
+        return [filename for filename, _ in deleted]
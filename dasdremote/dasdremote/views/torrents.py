@@ -1,12 +1,20 @@
+from datetime import timedelta
+import hashlib
+import math
 import os
+import time
 
 from django.conf import settings
+from django.db.models import Count, Max
 from django.http import (
     HttpResponse,
+    HttpResponseBadRequest,
     HttpResponseNotFound,
+    HttpResponseNotModified,
     HttpResponseServerError,
     JsonResponse
 )
+from django.utils.dateparse import parse_datetime
 from rest_framework.renderers import JSONRenderer
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
@@ -14,8 +22,59 @@ from rest_framework.views import APIView
 from dasdremote.authentication import DaSDRemoteTokenAuthentication
 from dasdremote.logger import log
 from dasdremote.models import PackageFile, Torrent
-from dasdremote.serializers import TorrentPackageSerializer
+from dasdremote.serializers import TorrentPackageBatchSerializer, TorrentPackageSerializer
 from dasdremote.torrent_package import TorrentDoesNotExistException, TorrentPackage
+import dasdremote.utils as utils
+
+
+# Torrents modified this long before the cursor are listed again, in case
+# they were committed after a later modification was listed
+CURSOR_OVERLAP = timedelta(seconds=5)
+
+# Default and longest time a long poll request waits. The longest wait must
+# stay below the wsgi server worker timeout.
+WAIT_DEFAULT_TIMEOUT_SEC = 20
+WAIT_MAX_TIMEOUT_SEC = 25
+
+
+def get_packaged_torrents_since(cursor):
+    """Return names of packaged torrents modified after datetime `cursor`
+    and the cursor for the next request. A cursor of None lists all
+    packaged torrents.
+    """
+    packaged_torrents = Torrent.objects.filter(package_files_count__gt=0)
+    if cursor is not None:
+        packaged_torrents = packaged_torrents.filter(last_modified__gt=cursor - CURSOR_OVERLAP)
+
+    torrents = []
+    for name, last_modified in packaged_torrents.order_by('last_modified').values_list('name', 'last_modified'):
+        torrents.append(name)
+        cursor = last_modified if cursor is None else max(cursor, last_modified)
+    return torrents, cursor
+
+
+def parse_cursor(since):
+    """Return datetime of `since` cursor, None for an empty cursor. Raise
+    ValueError if the cursor is invalid.
+    """
+    if not since:
+        return None
+    cursor = parse_datetime(since)
+    if cursor is None:
+        raise ValueError('Invalid cursor: %s' % since)
+    return cursor
+
+
+def parse_wait_timeout(timeout):
+    """Return wait timeout in seconds of `timeout`, capped to the longest
+    wait. Raise ValueError if the timeout is invalid.
+    """
+    if not timeout:
+        return WAIT_DEFAULT_TIMEOUT_SEC
+    timeout_sec = float(timeout)
+    if math.isnan(timeout_sec) or math.isinf(timeout_sec):
+        raise ValueError('Invalid timeout: %s' % timeout)
+    return min(max(timeout_sec, 0), WAIT_MAX_TIMEOUT_SEC)
 
 
 class DaSDRemoteTorrentViews(APIView):
@@ -27,6 +86,10 @@ class DaSDRemoteTorrentViews(APIView):
         # Validate input
         serializer = TorrentPackageSerializer(data=request.data)
         if not serializer.is_valid(raise_exception=False):
+            if 'since' in request.query_params:
+                # Return packaged torrents changed since cursor
+                return self._get_packaged_torrents_since(request, request.query_params['since'])
+
             # Return list of packaged torrents
             packaged_torrents = Torrent.objects.filter(package_files_count__gt=0)
             return JsonResponse([torrent.name for torrent in packaged_torrents], safe=False)
@@ -52,6 +115,69 @@ class DaSDRemoteTorrentViews(APIView):
             log.exception("Error")
             return HttpResponseServerError()
 
+    def post(self, request, format=None):
+        """Return package files of several torrents. Torrents that do not
+        exist or are not packaged yet map to None.
+        """
+        # Validate input
+        serializer = TorrentPackageBatchSerializer(data=request.data)
+        if not serializer.is_valid(raise_exception=False):
+            return HttpResponseBadRequest()
+
+        torrent_names = serializer.data['torrents']
+        log.debug('Get package files for %d torrents' % len(torrent_names))
+
+        try:
+            package_files = dict((torrent_name, None) for torrent_name in torrent_names)
+            packaged_torrents = Torrent.objects.filter(name__in=torrent_names, package_files_count__gt=0)
+            for torrent in packaged_torrents.values_list('name', flat=True):
+                package_files[torrent] = []
+
+            # Get package files of all torrents in one query
+            rows = PackageFile.objects\
+                .filter(torrent__name__in=torrent_names, torrent__package_files_count__gt=0)\
+                .order_by('filename')\
+                .values_list('torrent__name', 'filename', 'filesize', 'sha256')
+            for torrent_name, filename, filesize, sha256 in rows:
+                package_files[torrent_name].append({
+                    'filename': filename,
+                    'filesize': filesize,
+                    'sha256': sha256
+                })
+            return JsonResponse(package_files)
+        except:
+            log.exception("Error")
+            return HttpResponseServerError()
+
+    def _get_packaged_torrents_etag(self):
+        """Return ETag that changes whenever a torrent is packaged"""
+        state = Torrent.objects.filter(package_files_count__gt=0).aggregate(
+            count=Count('id'), last_modified=Max('last_modified')
+        )
+        last_modified = state['last_modified'].isoformat() if state['last_modified'] else ''
+        return '"%s"' % hashlib.sha1('%d:%s' % (state['count'], last_modified)).hexdigest()
+
+    def _get_packaged_torrents_since(self, request, since):
+        """Return packaged torrents modified after the `since` cursor and
+        the cursor for the next request. An empty cursor lists all packaged
+        torrents.
+        """
+        etag = self._get_packaged_torrents_etag()
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            return HttpResponseNotModified()
+
+        try:
+            torrents, cursor = get_packaged_torrents_since(parse_cursor(since))
+        except ValueError:
+            return HttpResponseBadRequest()
+
+        response = JsonResponse({
+            'torrents': torrents,
+            'cursor': cursor.isoformat() if cursor else ''
+        })
+        response['ETag'] = etag
+        return response
+
     def _get_package_files(self, torrent):
         package_files = []
         for package_file in torrent.package_file_set.all().order_by('filename'):
@@ -61,3 +187,46 @@ class DaSDRemoteTorrentViews(APIView):
                 'sha256': package_file.sha256
             })
         return package_files
+
+
+class DaSDRemoteTorrentWaitViews(APIView):
+    authentication_classes = (DaSDRemoteTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    renderer_classes = (JSONRenderer,)
+
+    def get(self, request, format=None):
+        """Wait until a torrent is packaged after the `since` cursor or the
+        timeout expires. Then return packaged torrents like an incremental
+        listing, with no torrents on timeout.
+        """
+        try:
+            cursor = parse_cursor(request.query_params.get('since', ''))
+            timeout = parse_wait_timeout(request.query_params.get('timeout'))
+        except ValueError:
+            return HttpResponseBadRequest()
+
+        notify_file = settings.DASDREMOTE.get('PACKAGED_NOTIFY_FILE', '/tmp/dasdremote-packaged')
+        deadline = time.time() + timeout
+        with utils.notify.Notifier(notify_file) as notifier:
+            # Watch before checking, so a torrent packaged in between
+            # still wakes up the wait
+            while not self._has_packaged_torrents_after(cursor):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return JsonResponse({
+                        'torrents': [],
+                        'cursor': cursor.isoformat() if cursor else ''
+                    })
+                notifier.wait(remaining)
+
+        torrents, cursor = get_packaged_torrents_since(cursor)
+        return JsonResponse({
+            'torrents': torrents,
+            'cursor': cursor.isoformat() if cursor else ''
+        })
+
+    def _has_packaged_torrents_after(self, cursor):
+        packaged_torrents = Torrent.objects.filter(package_files_count__gt=0)
+        if cursor is not None:
+            packaged_torrents = packaged_torrents.filter(last_modified__gt=cursor)
+        return packaged_torrents.exists()
@@ -1,15 +1,34 @@
 import os
+import signal
 
 from django.conf import settings
+from django.db import transaction
 
 from dasdremote.models import PackageFile
 from dasdremote.torrent_package import TorrentPackage
+import dasdremote.utils as utils
 from dasdremote.workers import DaSDRemoteWorker
 
 
+def init_package_process():
+    """Ignore interrupts in pool processes, the daemon handles stopping"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def package_torrent(source_path, output_dir, min_package_file_size, max_package_files, **kwargs):
+    """Package torrent and return list of package files. Runs in the
+    packager thread or in a pool process.
+    """
+    tp = TorrentPackage(source_path, output_dir, min_package_file_size, max_package_files, **kwargs)
+    return list(tp.create_package())
+
+
 class CompletedTorrentPackager(DaSDRemoteWorker):
 
     def __init__(self, *args, **kwargs):
+        # Process pool to package torrents in, or None to package in thread
+        self._pool = kwargs.pop('pool', None)
+
         super(CompletedTorrentPackager, self).__init__(*args, **kwargs)
 
         # Parse config
@@ -17,6 +36,11 @@ class CompletedTorrentPackager(DaSDRemoteWorker):
         self._packaged_torrents_dir = settings.DASDREMOTE['PACKAGED_TORRENTS_DIR']
         self._min_package_file_size = settings.DASDREMOTE['TORRENT_PACKAGE_MIN_PACKAGE_FILE_BYTES']
         self._max_package_files = settings.DASDREMOTE['TORRENT_PACKAGE_MAX_PACKAGE_FILES']
+        self._stream = settings.DASDREMOTE.get('TORRENT_PACKAGE_STREAM', False)
+        self._compress_threads = settings.DASDREMOTE.get('TORRENT_PACKAGE_COMPRESS_THREADS', 1)
+        self._compression = settings.DASDREMOTE.get('TORRENT_PACKAGE_COMPRESSION', TorrentPackage.COMPRESSION_GZIP)
+        self._virtual_parts = settings.DASDREMOTE.get('TORRENT_PACKAGE_VIRTUAL_PARTS', False)
+        self._notify_file = settings.DASDREMOTE.get('PACKAGED_NOTIFY_FILE', '/tmp/dasdremote-packaged')
         self._sleep = 0
 
     def do_work(self):
@@ -27,16 +51,31 @@ class CompletedTorrentPackager(DaSDRemoteWorker):
         try:
             # Package torrent and save package files
             torrent_path = os.path.join(self._completed_torrents_dir, torrent.name)
-            tp = TorrentPackage(
+            args = (
                 torrent_path, self._packaged_torrents_dir,
                 self._min_package_file_size, self._max_package_files
             )
-            package_files_count = 0
-            for package_file in tp.create_package():
-                PackageFile.objects.create(torrent=torrent, **package_file)
-                package_files_count += 1
-            torrent.package_files_count = package_files_count
-            torrent.save()
+            kwargs = {
+                'stream': self._stream,
+                'compress_threads': self._compress_threads,
+                'compression': self._compression,
+                'virtual_parts': self._virtual_parts
+            }
+            if self._pool is None:
+                package_files = package_torrent(*args, **kwargs)
+            else:
+                package_files = self._pool.apply(package_torrent, args, kwargs)
+
+            with transaction.atomic():
+                PackageFile.objects.bulk_create([
+                    PackageFile(torrent=torrent, **package_file)
+                    for package_file in package_files
+                ])
+                torrent.package_files_count = len(package_files)
+                torrent.save()
+
+            # Wake up requests waiting for packaged torrents
+            utils.notify.notify(self._notify_file)
             self.log.info('Packaged torrent: %s (%d files)', torrent.name, torrent.package_files_count)
         except:
             self.log.exception('Failed to package torrent: %s' % torrent.name)
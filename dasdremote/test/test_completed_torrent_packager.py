@@ -0,0 +1,109 @@
+import logging
+from multiprocessing import Pool
+import os
+from Queue import Queue
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+
+from dasdremote.daemon import DaServerDaemonRemote
+from dasdremote.models import PackageFile, Torrent
+import dasdremote.utils as utils
+from dasdremote.workers import CompletedTorrentPackager
+from dasdremote.workers.completed_torrent_packager import init_package_process
+
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+class CompletedTorrentPackagerTests(TestCase):
+
+    def setUp(self):
+        # Create temp completed and packaged torrents directories
+        self.test_dir = tempfile.mkdtemp()
+        self.completed_torrents_dir = os.path.join(self.test_dir, 'completed')
+        self.packaged_torrents_dir = os.path.join(self.test_dir, 'packaged')
+        os.mkdir(self.completed_torrents_dir)
+        os.mkdir(self.packaged_torrents_dir)
+        dasdremote_settings = dict(
+            settings.DASDREMOTE,
+            COMPLETED_TORRENTS_DIR=self.completed_torrents_dir,
+            PACKAGED_TORRENTS_DIR=self.packaged_torrents_dir,
+            PACKAGED_NOTIFY_FILE=os.path.join(self.test_dir, 'notify'),
+            TORRENT_PACKAGE_MIN_PACKAGE_FILE_BYTES=utils.size.KB,
+            TORRENT_PACKAGE_MAX_PACKAGE_FILES=1000,
+            TORRENT_PACKAGE_COMPRESSION='none',
+            TORRENT_PACKAGE_VIRTUAL_PARTS=False
+        )
+        self.settings_override = override_settings(DASDREMOTE=dasdremote_settings)
+        self.settings_override.enable()
+
+        # Create completed torrent
+        utils.fs.write_random_file(os.path.join(self.completed_torrents_dir, 'Torrent.bin'), 10*utils.size.KB)
+        self.torrent = Torrent.objects.create(name='Torrent.bin')
+        self.queue = Queue()
+        self.queue.put(self.torrent)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.test_dir)
+
+    def _create_packager(self, pool=None):
+        return CompletedTorrentPackager(
+            name='CompletedTorrentPackager-0',
+            log=log,
+            torrent_queue=self.queue,
+            pool=pool
+        )
+
+    def test_do_work_pool(self):
+        # Package torrent in pool process
+        pool = Pool(2, init_package_process)
+        try:
+            self._create_packager(pool=pool).do_work()
+        finally:
+            pool.close()
+            pool.join()
+
+        # Verify package files were saved for torrent
+        self.torrent.refresh_from_db()
+        package_files = PackageFile.objects.filter(torrent=self.torrent)
+        self.assertGreater(self.torrent.package_files_count, 0)
+        self.assertEqual(self.torrent.package_files_count, package_files.count())
+        for package_file in package_files:
+            path = os.path.join(self.packaged_torrents_dir, package_file.filename)
+            self.assertEqual(package_file.filesize, os.path.getsize(path))
+            self.assertEqual(package_file.sha256, utils.hash.compute_sha256(path))
+        self.assertTrue(self.queue.empty())
+
+    def test_do_work_all_or_nothing(self):
+        # Fail saving torrent after package files were inserted
+        def _save(*args, **kwargs):
+            raise DatabaseError('Failed to save torrent')
+
+        save = Torrent.save
+        Torrent.save = _save
+        try:
+            self._create_packager().do_work()
+        finally:
+            Torrent.save = save
+
+        # Verify no package files were saved and torrent was queued again
+        self.torrent.refresh_from_db()
+        self.assertEqual(0, self.torrent.package_files_count)
+        self.assertFalse(self.torrent.is_packaged())
+        self.assertEqual(0, PackageFile.objects.count())
+        self.assertEqual(self.torrent, self.queue.get_nowait())
+
+    def test_daemon_threads_at_least_processes(self):
+        dasdremote_settings = dict(
+            settings.DASDREMOTE,
+            COMPLETED_TORRENT_PACKAGER_NUM_THREADS=1,
+            COMPLETED_TORRENT_PACKAGER_NUM_PROCESSES=4
+        )
+        with override_settings(DASDREMOTE=dasdremote_settings):
+            daemon = DaServerDaemonRemote()
+        self.assertEqual(4, daemon._complete_torrent_packager_num_threads)
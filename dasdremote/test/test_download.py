@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from dasdremote.models import DaSDRemoteToken, PackageFile, Torrent
+
+
+class DownloadViewTests(TestCase):
+
+    def setUp(self):
+        # Create temp packaged torrents directory
+        self.test_dir = tempfile.mkdtemp()
+        dasdremote_settings = dict(settings.DASDREMOTE, PACKAGED_TORRENTS_DIR=self.test_dir)
+        self.settings_override = override_settings(DASDREMOTE=dasdremote_settings)
+        self.settings_override.enable()
+
+        # Create authenticated client
+        user = User.objects.create_user('test', password='test')
+        token = DaSDRemoteToken.objects.create(user=user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token %s' % token.key)
+
+        # Create archive with two virtual package files
+        self.data = os.urandom(1000)
+        with open(os.path.join(self.test_dir, 'Torrent.tar.gz'), 'wb') as out_file:
+            out_file.write(self.data)
+        self.torrent = Torrent.objects.create(name='Torrent', package_files_count=2)
+        for i, (offset, filesize) in enumerate([(0, 600), (600, 400)]):
+            PackageFile.objects.create(
+                filename='Torrent.tar.gz.%04d' % i,
+                filesize=filesize,
+                torrent=self.torrent,
+                archive_filename='Torrent.tar.gz',
+                offset=offset
+            )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.test_dir)
+
+    def _get(self, filename, range_header=None):
+        kwargs = {}
+        if range_header is not None:
+            kwargs['HTTP_RANGE'] = range_header
+        return self.client.get('/download/%s/' % filename, **kwargs)
+
+    def _content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_get_virtual_full_file(self):
+        response = self._get('Torrent.tar.gz.0001')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('400', response['Content-Length'])
+        self.assertFalse(response.has_header('Content-Range'))
+        self.assertEqual(self.data[600:], self._content(response))
+
+    def test_get_virtual_open_ended_range(self):
+        response = self._get('Torrent.tar.gz.0001', 'bytes=100-')
+
+        self.assertEqual(206, response.status_code)
+        self.assertEqual('300', response['Content-Length'])
+        self.assertEqual('bytes 100-399/400', response['Content-Range'])
+        self.assertEqual(self.data[700:], self._content(response))
+
+    def test_get_virtual_bounded_range(self):
+        response = self._get('Torrent.tar.gz.0000', 'bytes=10-19')
+
+        self.assertEqual(206, response.status_code)
+        self.assertEqual('10', response['Content-Length'])
+        self.assertEqual('bytes 10-19/600', response['Content-Range'])
+        self.assertEqual(self.data[10:20], self._content(response))
+
+        # Range past the end of the package file is truncated
+        response = self._get('Torrent.tar.gz.0000', 'bytes=590-1000')
+        self.assertEqual(206, response.status_code)
+        self.assertEqual('bytes 590-599/600', response['Content-Range'])
+        self.assertEqual(self.data[590:600], self._content(response))
+
+    def test_get_virtual_range_start_past_end(self):
+        response = self._get('Torrent.tar.gz.0001', 'bytes=400-')
+
+        self.assertEqual(416, response.status_code)
+        self.assertEqual('bytes */400', response['Content-Range'])
+
+    def test_get_virtual_range_start_after_stop(self):
+        response = self._get('Torrent.tar.gz.0001', 'bytes=10-5')
+
+        self.assertEqual(416, response.status_code)
+        self.assertEqual('bytes */400', response['Content-Range'])
+
+    def test_get_virtual_deleted(self):
+        PackageFile.objects.filter(filename='Torrent.tar.gz.0000').update(deleted=True)
+
+        response = self._get('Torrent.tar.gz.0000')
+        self.assertEqual(404, response.status_code)
+
+    def test_delete_batch(self):
+        # Create real package file
+        with open(os.path.join(self.test_dir, 'Real.0000'), 'wb') as out_file:
+            out_file.write(b'data')
+
+        # Delete real, virtual and missing package files in one request
+        filenames = ['Real.0000', 'Torrent.tar.gz.0000', 'Torrent.tar.gz.0001', 'Missing.0000']
+        response = self.client.delete('/download/', {'filenames': filenames}, format='json')
+        self.assertEqual(200, response.status_code)
+        result = response.json()
+        self.assertEqual(['Real.0000', 'Torrent.tar.gz.0000', 'Torrent.tar.gz.0001'], sorted(result['deleted']))
+        self.assertEqual(['Missing.0000'], result['missing'])
+
+        # Verify files and archive of all deleted virtual package files are removed
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'Real.0000')))
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'Torrent.tar.gz')))
+        self.assertEqual(2, PackageFile.objects.filter(deleted=True).count())
+
+        # Verify deleted package files are missing when deleted again
+        response = self.client.delete('/download/', {'filenames': filenames}, format='json')
+        self.assertEqual([], response.json()['deleted'])
+        self.assertEqual(sorted(filenames), response.json()['missing'])
+
+    def test_delete_batch_keeps_archive(self):
+        # Delete one of the virtual package files of the archive
+        response = self.client.delete('/download/', {'filenames': ['Torrent.tar.gz.0000']}, format='json')
+        self.assertEqual(['Torrent.tar.gz.0000'], response.json()['deleted'])
+        self.assertEqual([], response.json()['missing'])
+
+        # Verify archive is kept for the other package file
+        self.assertTrue(os.path.isfile(os.path.join(self.test_dir, 'Torrent.tar.gz')))
+        self.assertEqual(200, self._get('Torrent.tar.gz.0001').status_code)
+        self.assertEqual(404, self._get('Torrent.tar.gz.0000').status_code)
+
+    def test_delete_batch_invalid(self):
+        response = self.client.delete('/download/', {'filenames': ['../secrets.json']}, format='json')
+        self.assertEqual(400, response.status_code)
@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+import dasdremote.utils as utils
+
+
+class NotifierTests(SimpleTestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, 'notify', 'packaged')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _notify_later(self, delay_sec):
+        thread = threading.Timer(delay_sec, utils.notify.notify, args=(self.path,))
+        thread.start()
+        return thread
+
+    def test_wait_notified(self):
+        with utils.notify.Notifier(self.path) as notifier:
+            thread = self._notify_later(0.1)
+            start = time.time()
+            self.assertTrue(notifier.wait(5))
+            self.assertLess(time.time() - start, 5)
+        thread.join()
+
+    def test_wait_timeout(self):
+        with utils.notify.Notifier(self.path) as notifier:
+            start = time.time()
+            self.assertFalse(notifier.wait(0.2))
+            self.assertGreaterEqual(time.time() - start, 0.15)
+
+    def test_notify_before_enter_not_seen(self):
+        utils.notify.notify(self.path)
+        self.assertTrue(os.path.isfile(self.path))
+
+        with utils.notify.Notifier(self.path) as notifier:
+            self.assertFalse(notifier.wait(0.1))
@@ -1,5 +1,8 @@
+import gzip
+import hashlib
 import os
 import shutil
+import tarfile
 import tempfile
 
 from django.test import TestCase
@@ -205,3 +208,190 @@ class PackageTorrentTests(TestCase):
 
         # Verify total file size
         self.assertEqual(total_archive_size, sum([sf['filesize'] for sf in split_files]))
+
+    def test_stream_package_directory(self):
+        # Create source directory
+        dirname = 'test-dir'
+        source_path = os.path.join(self.test_dir, dirname)
+        utils.fs.mkdir_p(source_path)
+
+        # Create file in source directory
+        filename = 'test-file.bin'
+        filesize = 20*utils.size.MB
+        filepath = os.path.join(source_path, filename)
+        utils.fs.write_random_file(filepath, filesize)
+
+        # Create instance
+        split_bytes = utils.size.MB
+        tp = TorrentPackage(source_path, self.test_dir, min_package_file_size=split_bytes, max_package_files=1000, stream=True)
+
+        # Create package
+        split_files = list(tp.create_package())
+
+        # Verify archive was not written
+        self.assertFalse(os.path.isfile(tp.archive_path))
+
+        # Verify number of split files
+        expected_num_split_files = filesize / split_bytes + 1
+        self.assertEqual(expected_num_split_files, len(split_files))
+
+        archive_path = os.path.join(self.test_dir, 'joined.tgz')
+        with open(archive_path, 'wb') as archive_file:
+            for sf in split_files:
+                path = os.path.join(self.test_dir, sf['filename'])
+
+                # Verify split file size
+                self.assertLessEqual(os.path.getsize(path), split_bytes)
+                self.assertEqual(os.path.getsize(path), sf['filesize'])
+
+                # Verify split file sha256
+                self.assertEqual(utils.hash.compute_sha256(path), sf['sha256'])
+
+                with open(path, 'rb') as split_file:
+                    archive_file.write(split_file.read())
+
+        # Verify joined split files are the archive
+        with tarfile.open(archive_path) as tf:
+            self.assertEqual([dirname, os.path.join(dirname, filename)], tf.getnames())
+
+    def test_stream_package_max_package_files(self):
+        min_package_file_size = 10*utils.size.KB
+        max_package_files = 5
+
+        # Create source file
+        filepath = os.path.join(self.test_dir, 'source.bin')
+        utils.fs.write_random_file(filepath, 123*utils.size.KB)
+
+        # Create package
+        tp = TorrentPackage(filepath, self.test_dir, min_package_file_size, max_package_files, stream=True)
+        split_files = list(tp.create_package())
+
+        # Verify number of split files is within limits
+        self.assertLessEqual(len(split_files), max_package_files)
+        for split_file in split_files[:-1]:
+            self.assertGreater(split_file['filesize'], min_package_file_size)
+
+    def test_parallel_gzip_writer(self):
+        # Create data with compressible and incompressible blocks
+        data = os.urandom(3*utils.size.MB) + b'0123456789' * utils.size.MB
+
+        # Compress data in small writes
+        archive_path = os.path.join(self.test_dir, 'data.gz')
+        with open(archive_path, 'wb') as out_file:
+            with utils.pgzip.ParallelGzipWriter(out_file, 4, block_size=256*utils.size.KB) as gz:
+                for i in xrange(0, len(data), 10*utils.size.KB):
+                    gz.write(data[i:i + 10*utils.size.KB])
+
+        # Verify data is a single gzip stream
+        with gzip.open(archive_path, 'rb') as in_file:
+            self.assertEqual(data, in_file.read())
+
+    def test_stream_package_compress_threads(self):
+        # Create source directory
+        dirname = 'test-dir'
+        source_path = os.path.join(self.test_dir, dirname)
+        utils.fs.mkdir_p(source_path)
+
+        # Create file in source directory
+        filename = 'test-file.bin'
+        filepath = os.path.join(source_path, filename)
+        utils.fs.write_random_file(filepath, 5*utils.size.MB)
+
+        # Create package compressed on multiple threads
+        tp = TorrentPackage(source_path, self.test_dir, min_package_file_size=utils.size.MB,
+                            max_package_files=1000, stream=True, compress_threads=4)
+        split_files = list(tp.create_package())
+
+        # Join split files
+        archive_path = os.path.join(self.test_dir, 'joined.tgz')
+        with open(archive_path, 'wb') as archive_file:
+            for sf in split_files:
+                with open(os.path.join(self.test_dir, sf['filename']), 'rb') as split_file:
+                    archive_file.write(split_file.read())
+
+        # Verify archive can be read as a stream
+        with open(archive_path, 'rb') as archive_file:
+            with tarfile.open(fileobj=archive_file, mode='r|*') as tf:
+                self.assertEqual([dirname, os.path.join(dirname, filename)], tf.getnames())
+
+    def test_auto_compression(self):
+        # Create source directory with text file
+        source_path = os.path.join(self.test_dir, 'test-dir')
+        utils.fs.mkdir_p(source_path)
+        with open(os.path.join(source_path, 'test-file.txt'), 'wb') as f:
+            f.write(b'0123456789' * utils.size.MB)
+
+        # Verify compressible source is gzipped
+        tp = TorrentPackage(source_path, self.test_dir, compression=TorrentPackage.COMPRESSION_AUTO)
+        self.assertEqual(TorrentPackage.COMPRESSION_GZIP, tp.compression)
+        self.assertTrue(tp.archive_path.endswith('.tgz'))
+
+        # Create larger compressed and random files
+        utils.fs.write_random_file(os.path.join(source_path, 'test-file.mkv'), 20*utils.size.MB)
+        utils.fs.write_random_file(os.path.join(source_path, 'test-file.bin'), 20*utils.size.MB)
+
+        # Verify incompressible source is not compressed
+        tp = TorrentPackage(source_path, self.test_dir, compression=TorrentPackage.COMPRESSION_AUTO)
+        self.assertEqual(TorrentPackage.COMPRESSION_NONE, tp.compression)
+        self.assertTrue(tp.archive_path.endswith('.tar'))
+
+    def test_stream_package_no_compression(self):
+        # Create source file
+        filename = 'test-file.mkv'
+        source_path = os.path.join(self.test_dir, filename)
+        utils.fs.write_random_file(source_path, 5*utils.size.MB)
+
+        # Create package without compression
+        tp = TorrentPackage(source_path, self.test_dir, min_package_file_size=utils.size.MB,
+                            max_package_files=1000, stream=True, compression=TorrentPackage.COMPRESSION_NONE)
+        split_files = list(tp.create_package())
+
+        # Join split files
+        archive_path = os.path.join(self.test_dir, 'joined.tar')
+        with open(archive_path, 'wb') as archive_file:
+            for sf in split_files:
+                with open(os.path.join(self.test_dir, sf['filename']), 'rb') as split_file:
+                    archive_file.write(split_file.read())
+
+        # Verify archive is a plain tar file detected by tarfile
+        with tarfile.open(archive_path, 'r:') as tf:
+            self.assertEqual([filename], tf.getnames())
+        with open(archive_path, 'rb') as archive_file:
+            with tarfile.open(fileobj=archive_file, mode='r|*') as tf:
+                self.assertEqual([filename], tf.getnames())
+
+    def test_invalid_compression(self):
+        with self.assertRaises(ValueError):
+            TorrentPackage(self.test_dir, self.test_dir, compression='bzip2')
+
+    def test_package_virtual_parts(self):
+        # Create source file
+        filename = 'test-file.bin'
+        source_path = os.path.join(self.test_dir, filename)
+        utils.fs.write_random_file(source_path, 5*utils.size.MB)
+
+        # Create package with package files as ranges of one archive
+        output_dir = os.path.join(self.test_dir, 'output')
+        utils.fs.mkdir_p(output_dir)
+        tp = TorrentPackage(source_path, output_dir, min_package_file_size=utils.size.MB,
+                            max_package_files=1000, virtual_parts=True)
+        split_files = list(tp.create_package())
+
+        # Verify only the archive was written
+        self.assertEqual([os.path.basename(tp.archive_path)], os.listdir(output_dir))
+
+        with open(tp.archive_path, 'rb') as archive_file:
+            archive = archive_file.read()
+
+        # Verify package files cover the archive
+        self.assertEqual(len(archive), sum([sf['filesize'] for sf in split_files]))
+
+        offset = 0
+        for sf in split_files:
+            # Verify package file range and sha256
+            self.assertEqual(os.path.basename(tp.archive_path), sf['archive_filename'])
+            self.assertEqual(offset, sf['offset'])
+            self.assertLessEqual(sf['filesize'], utils.size.MB)
+            data = archive[sf['offset']:sf['offset'] + sf['filesize']]
+            self.assertEqual(hashlib.sha256(data).hexdigest(), sf['sha256'])
+            offset += sf['filesize']
@@ -0,0 +1,214 @@
+from datetime import timedelta
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from mock import patch
+from rest_framework.test import APIClient
+
+from dasdremote.models import DaSDRemoteToken, PackageFile, Torrent
+import dasdremote.utils as utils
+from dasdremote.views.torrents import parse_wait_timeout, WAIT_DEFAULT_TIMEOUT_SEC, WAIT_MAX_TIMEOUT_SEC
+
+
+class TorrentViewTestsMixin(object):
+
+    def setUp(self):
+        # Create authenticated client
+        user = User.objects.create_user('test', password='test')
+        token = DaSDRemoteToken.objects.create(user=user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token %s' % token.key)
+
+    def _create_torrent(self, name, package_files_count=1, last_modified=None):
+        torrent = Torrent.objects.create(name=name, package_files_count=package_files_count)
+        for i in xrange(package_files_count):
+            PackageFile.objects.create(
+                filename='%s.%04d' % (name, i),
+                filesize=i + 1,
+                sha256='sha256-%d' % i,
+                torrent=torrent
+            )
+        if last_modified is not None:
+            # Bypass save, which sets last modified time to now
+            Torrent.objects.filter(pk=torrent.pk).update(last_modified=last_modified)
+            torrent.refresh_from_db()
+        return torrent
+
+
+class TorrentViewTests(TorrentViewTestsMixin, TestCase):
+
+    def _get_since(self, since, etag=None):
+        kwargs = {}
+        if etag is not None:
+            kwargs['HTTP_IF_NONE_MATCH'] = etag
+        return self.client.get('/torrents/', {'since': since}, **kwargs)
+
+    def test_post_batch(self):
+        self._create_torrent('Torrent1', package_files_count=2)
+        self._create_torrent('Torrent2', package_files_count=1)
+        self._create_torrent('NotPackaged', package_files_count=0)
+
+        # Verify package files of each torrent, None if not packaged
+        response = self.client.post(
+            '/torrents/',
+            {'torrents': ['Torrent1', 'Torrent2', 'NotPackaged', 'DoesNotExist']},
+            format='json'
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            {
+                'Torrent1': [
+                    {'filename': 'Torrent1.0000', 'filesize': 1, 'sha256': 'sha256-0'},
+                    {'filename': 'Torrent1.0001', 'filesize': 2, 'sha256': 'sha256-1'}
+                ],
+                'Torrent2': [
+                    {'filename': 'Torrent2.0000', 'filesize': 1, 'sha256': 'sha256-0'}
+                ],
+                'NotPackaged': None,
+                'DoesNotExist': None
+            },
+            response.json()
+        )
+
+    def test_post_batch_invalid(self):
+        response = self.client.post('/torrents/', {'torrent': 'Torrent1'}, format='json')
+        self.assertEqual(400, response.status_code)
+
+    def test_get_since_all(self):
+        self._create_torrent('Torrent1')
+        self._create_torrent('Torrent2')
+        self._create_torrent('NotPackaged', package_files_count=0)
+
+        # Verify empty cursor lists all packaged torrents
+        response = self._get_since('')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['Torrent1', 'Torrent2'], response.json()['torrents'])
+
+    def test_get_since_cursor_overlap(self):
+        cursor = timezone.now()
+        self._create_torrent('Old', last_modified=cursor - timedelta(seconds=10))
+        self._create_torrent('Overlap', last_modified=cursor - timedelta(seconds=3))
+        new = self._create_torrent('New', last_modified=cursor + timedelta(seconds=1))
+
+        # Verify torrents modified up to 5s before the cursor are listed again
+        response = self._get_since(cursor.isoformat())
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['Overlap', 'New'], response.json()['torrents'])
+        self.assertEqual(new.last_modified, parse_datetime(response.json()['cursor']))
+
+    def test_get_since_invalid_cursor(self):
+        response = self._get_since('not-a-date')
+        self.assertEqual(400, response.status_code)
+
+    def test_get_since_not_modified(self):
+        self._create_torrent('Torrent1')
+
+        # Verify unchanged ETag returns 304
+        etag = self._get_since('')['ETag']
+        response = self._get_since('', etag=etag)
+        self.assertEqual(304, response.status_code)
+
+    def test_get_since_etag_changes(self):
+        torrent = self._create_torrent('Torrent1', last_modified=timezone.now() - timedelta(seconds=60))
+        etags = [self._get_since('')['ETag']]
+
+        # Add torrent
+        self._create_torrent('Torrent2', last_modified=timezone.now() - timedelta(seconds=30))
+        etags.append(self._get_since('')['ETag'])
+
+        # Re-save torrent
+        torrent.save()
+        etags.append(self._get_since('')['ETag'])
+
+        # Delete torrent
+        torrent.delete()
+        etags.append(self._get_since('')['ETag'])
+
+        # Verify every change made a new ETag, and the old ones are modified
+        self.assertEqual(len(etags), len(set(etags)))
+        for etag in etags[:-1]:
+            self.assertEqual(200, self._get_since('', etag=etag).status_code)
+
+
+class TorrentWaitViewTests(TorrentViewTestsMixin, TestCase):
+
+    def setUp(self):
+        super(TorrentWaitViewTests, self).setUp()
+
+        # Use temp notify file
+        self.test_dir = tempfile.mkdtemp()
+        self.notify_file = os.path.join(self.test_dir, 'packaged')
+        dasdremote_settings = dict(settings.DASDREMOTE, PACKAGED_NOTIFY_FILE=self.notify_file)
+        self.settings_override = override_settings(DASDREMOTE=dasdremote_settings)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.test_dir)
+
+    def _wait(self, since, timeout):
+        return self.client.get('/torrents/wait/', {'since': since, 'timeout': timeout})
+
+    def test_wait_notified(self):
+        cursor = timezone.now()
+
+        # Package torrent once the request waits and notify from another
+        # thread. The test database is only visible to this thread.
+        wait = utils.notify.Notifier.wait
+        threads = []
+        def _wait(notifier, timeout_sec):
+            if not threads:
+                self._create_torrent('Torrent1')
+                threads.append(threading.Timer(0.2, utils.notify.notify, args=(self.notify_file,)))
+                threads[0].start()
+            return wait(notifier, timeout_sec)
+
+        with patch.object(utils.notify.Notifier, 'wait', autospec=True, side_effect=_wait):
+            start = time.time()
+            response = self._wait(cursor.isoformat(), 10)
+        threads[0].join()
+
+        # Verify request returned the packaged torrent before the timeout
+        self.assertLess(time.time() - start, 10)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['Torrent1'], response.json()['torrents'])
+
+    def test_wait_timeout(self):
+        self._create_torrent('Torrent1', last_modified=timezone.now() - timedelta(seconds=60))
+        cursor = timezone.now().isoformat()
+
+        # Verify request returns no torrents and the same cursor on timeout
+        start = time.time()
+        response = self._wait(cursor, 0.2)
+        self.assertGreaterEqual(time.time() - start, 0.15)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([], response.json()['torrents'])
+        self.assertEqual(parse_datetime(cursor), parse_datetime(response.json()['cursor']))
+
+    def test_wait_invalid_timeout(self):
+        for timeout in ['forever', 'nan', 'inf', '-inf']:
+            response = self._wait('', timeout)
+            self.assertEqual(400, response.status_code)
+
+    def test_parse_wait_timeout(self):
+        self.assertEqual(WAIT_DEFAULT_TIMEOUT_SEC, parse_wait_timeout(None))
+        self.assertEqual(WAIT_DEFAULT_TIMEOUT_SEC, parse_wait_timeout(''))
+        self.assertEqual(5, parse_wait_timeout('5'))
+        self.assertEqual(0, parse_wait_timeout('-5'))
+
+        # Verify timeout is capped below the wsgi worker timeout
+        self.assertEqual(WAIT_MAX_TIMEOUT_SEC, parse_wait_timeout('300'))
+        self.assertLess(WAIT_MAX_TIMEOUT_SEC, 30)
+
+        # Verify timeout that can't be compared or waited on is invalid
+        for timeout in ['nan', 'inf', '-inf']:
+            with self.assertRaises(ValueError):
+                parse_wait_timeout(timeout)
@@ -31,8 +31,13 @@ class DaServerDaemon(object):
 
         # Managers
         self._requests_manager = RequestsManager(config=self._config)
-        self._database_manager = DatabaseManager()
-        self._queue_manager = QueueManager(database_manager=self._database_manager)
+        self._database_manager = DatabaseManager(
+            poll_interval_sec=float(self._config.get('DatabaseManager', {}).get('poll_interval_sec', 5))
+        )
+        self._queue_manager = QueueManager(
+            database_manager=self._database_manager,
+            batch_size=int(self._config.get('QueueManager', {}).get('batch_size', 1000))
+        )
         self._path_manager = PathManager(config=self._config)
         self._worker_manager = WorkerManager(
             config=self._config,
@@ -79,6 +84,8 @@ class DaServerDaemon(object):
         self._database_manager.join()
         self._worker_manager.join()
 
+        self._requests_manager.close()
+
     def _init_logger(self):
         """Get logger settings from config and initialize it"""
         logger.configure(self._config['logging'])
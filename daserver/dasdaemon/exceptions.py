@@ -38,6 +38,11 @@ class PackageExtractorError(DaSDError):
     pass
 
 
+class PackagedTorrentListerError(DaSDError):
+    """Packaged Torrent Lister error"""
+    pass
+
+
 class DaSDWorkerGroupError(DaSDError):
     pass
 
@@ -1,36 +1,58 @@
 import threading
-import time
 
 from django.conf import settings
+from django.db.models.signals import post_save
 
 from dasdaemon.logger import log
+from dasdapi.models import PackageFile, Torrent
 
 
 class DatabaseManager(threading.Thread):
 
     def __init__(self, group=None, target=None, name='DatabaseManager',
-                 args=(), kwargs=None, verbose=None):
+                 args=(), kwargs=None, verbose=None, poll_interval_sec=5):
         super(DatabaseManager, self).__init__(group=group, target=target,
                                               name=name, verbose=verbose)
 
         self.one_time_functions = []
         self.periodic_functions = []
+        self.poll_interval_sec = poll_interval_sec
         self.lock = threading.Lock()
         self.stop_signal = threading.Event()
+        self.wake_signal = threading.Event()
 
     def run(self):
-        """Execute query functions until stopped"""
+        """Execute query functions until stopped. Run again as soon as a
+        worker saves a torrent or package file, otherwise poll at the
+        configured interval.
+        """
         log.info('Started with database engine: %s', settings.DATABASES['default']['ENGINE'])
+        post_save.connect(self._on_model_saved, sender=Torrent)
+        post_save.connect(self._on_model_saved, sender=PackageFile)
         while not self.stop_signal.is_set():
+            self.wake_signal.clear()
             self._execute_query_functions()
-            # TODO: Make this configurable
-            time.sleep(5)
+            self.wake_signal.wait(self.poll_interval_sec)
+        post_save.disconnect(self._on_model_saved, sender=Torrent)
+        post_save.disconnect(self._on_model_saved, sender=PackageFile)
         log.info('Stopped')
 
     def stop(self):
         """Set stop signal"""
         log.info('DatabaseManager: Stopping')
         self.stop_signal.set()
+        self.wake_signal.set()
+
+    def notify(self):
+        """Wake up to run query functions"""
+        self.wake_signal.set()
+
+    def _on_model_saved(self, sender, **kwargs):
+        """Wake up when a worker thread saves an object. Saves made by query
+        functions are picked up by the next round.
+        """
+        if threading.current_thread() is not self:
+            self.notify()
 
     def register_one_time_function(self, function):
         """Add one time query function to list"""
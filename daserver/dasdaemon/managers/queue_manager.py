@@ -1,6 +1,9 @@
-from Queue import Queue
+from Queue import Empty, Queue
 import threading
 
+from django.db import transaction
+from django.utils import timezone
+
 from dasdaemon.logger import log
 from dasdapi.models import PackageFile, Torrent
 
@@ -26,10 +29,29 @@ class Consumer(object):
         )
 
 
+class ConsumerQueue(Queue):
+    """Queue of database objects for consumers"""
+
+    def get_if(self, predicate):
+        """Remove and return item at the head of queue without blocking, if
+        `predicate` returns true for it. Otherwise, raise Empty and leave
+        the item in the queue, so the queue keeps its order.
+        """
+        with self.not_empty:
+            if not self._qsize() or not predicate(self._peek()):
+                raise Empty
+            item = self._get()
+            self.not_full.notify()
+            return item
+
+    def _peek(self):
+        return self.queue[0]
+
+
 class QueueManager(object):
     """Register queue consumers and populate queues with database objects"""
 
-    def __init__(self, database_manager=None):
+    def __init__(self, database_manager=None, batch_size=1000):
         self.torrent_consumers = {}
         self.torrent_queues = {}
 
@@ -39,6 +61,7 @@ class QueueManager(object):
         self.lock = threading.Lock()
         self.stop_signal = threading.Event()
         self.database_manager = database_manager
+        self.batch_size = batch_size
 
     def register_torrent_consumer(self, consumer):
         """Register torrent consumer. If queue does not exist, then create
@@ -48,7 +71,7 @@ class QueueManager(object):
         with self.lock:
             if consumer not in self.torrent_consumers:
                 self.torrent_consumers[consumer] = 0
-                self.torrent_queues[consumer] = Queue()
+                self.torrent_queues[consumer] = ConsumerQueue()
                 log.debug('Registered torrent consumer: %s', consumer)
             self.torrent_consumers[consumer] += 1
             return self.torrent_queues[consumer]
@@ -61,7 +84,7 @@ class QueueManager(object):
         with self.lock:
             if consumer not in self.package_file_consumers:
                 self.package_file_consumers[consumer] = 0
-                self.package_file_queues[consumer] = Queue()
+                self.package_file_queues[consumer] = ConsumerQueue()
                 log.debug('Registered package file consumer: %s', consumer)
             self.package_file_consumers[consumer] += 1
             return self.package_file_queues[consumer]
@@ -91,25 +114,63 @@ class QueueManager(object):
     def _get_package_files_at_stage(self, stage):
         return PackageFile.objects.filter(stage=stage)
 
+    def _claim_torrents(self, consumer):
+        """Move a batch of torrents from ready stage to processing stage"""
+        return self._claim(
+            self._get_torrents_at_stage(consumer.ready_stage),
+            consumer,
+            last_modified=timezone.now()
+        )
+
+    def _claim_package_files(self, consumer):
+        """Move a batch of package files from ready stage to processing stage"""
+        return self._claim(
+            self._get_package_files_at_stage(consumer.ready_stage),
+            consumer
+        )
+
+    def _claim(self, queryset, consumer, **fields):
+        """Move up to batch size objects from ready stage to processing stage
+        with one update. Return only the objects that were claimed.
+        """
+        ids = list(queryset.values_list('id', flat=True)[:self.batch_size])
+        if not ids:
+            return []
+
+        model = queryset.model
+        with transaction.atomic():
+            model.objects\
+                .filter(id__in=ids, stage=consumer.ready_stage)\
+                .update(stage=consumer.processing_stage, **fields)
+            claimed = model.objects\
+                .filter(stage=consumer.processing_stage)\
+                .in_bulk(ids)
+        return [claimed[pk] for pk in ids if pk in claimed]
+
     def _execute_queries(self):
         """Loop through consumers and put database objects into queues.
-        Move database objects to processing stage before putting them into
-        the queues
+        Move database objects to processing stage in batches before putting
+        them into the queues
         """
         with self.lock:
             for consumer in self.torrent_consumers:
-                if self.stop_signal.is_set():
-                    return
                 log.debug('Processing torrent consumer: %s', consumer)
-                for obj in self._get_torrents_at_stage(consumer.ready_stage):
-                    obj.stage = consumer.processing_stage
-                    obj.save()
-                    self.torrent_queues[consumer].put(obj)
-            for consumer in self.package_file_consumers:
-                if self.stop_signal.is_set():
+                if not self._fill_queue(self.torrent_queues[consumer], self._claim_torrents, consumer):
                     return
+            for consumer in self.package_file_consumers:
                 log.debug('Processing package file consumer: %s', consumer)
-                for obj in self._get_package_files_at_stage(consumer.ready_stage):
-                    obj.stage = consumer.processing_stage
-                    obj.save()
-                    self.package_file_queues[consumer].put(obj)
+                if not self._fill_queue(self.package_file_queues[consumer], self._claim_package_files, consumer):
+                    return
+
+    def _fill_queue(self, queue, claim, consumer):
+        """Claim batches of objects and put them into queue until there are
+        no more ready objects. Return False if stopped.
+        """
+        while True:
+            if self.stop_signal.is_set():
+                return False
+            objs = claim(consumer)
+            for obj in objs:
+                queue.put(obj)
+            if len(objs) < self.batch_size:
+                return True
@@ -1,7 +1,11 @@
+from contextlib import contextmanager
 from datetime import datetime
 import os
+from Queue import Queue
 import requests
+from requests.adapters import HTTPAdapter
 import threading
+import time
 
 from dasdaemon.exceptions import DaSDRequestError
 from dasdaemon.logger import log
@@ -13,6 +17,60 @@ class RequestNewTokenError(Exception):
     pass
 
 
+class SessionPool(object):
+    """Bounded pool of persistent sessions shared by worker threads. A
+    session is checked out for the duration of a single request, so its
+    keep-alive connections are reused by every thread.
+    """
+
+    def __init__(self, size=4, connections=10, max_age_sec=None):
+        self.size = size
+        self.connections = connections
+        self.max_age_sec = max_age_sec
+
+        # Sessions are created lazily on first use
+        self._sessions = Queue(maxsize=size)
+        for _ in xrange(size):
+            self._sessions.put((None, 0))
+
+    @contextmanager
+    def session(self):
+        """Check out a session, blocking until one is available. Sessions
+        older than the max age are closed and replaced.
+        """
+        session, created = self._sessions.get()
+        try:
+            if session is not None and self._is_expired(created):
+                session.close()
+                session = None
+            if session is None:
+                session, created = self.create_session(), time.time()
+            yield session
+        finally:
+            self._sessions.put((session, created))
+
+    def close(self):
+        """Close all idle sessions and their connections"""
+        for _ in xrange(self.size):
+            session, _ = self._sessions.get()
+            if session is not None:
+                session.close()
+            self._sessions.put((None, 0))
+
+    def create_session(self):
+        """Return new session with the pool's connection settings"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=self.connections)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _is_expired(self, created):
+        if self.max_age_sec is None:
+            return False
+        return time.time() - created > self.max_age_sec
+
+
 class RequestsManager(object):
 
     def __init__(self, config):
@@ -23,26 +81,52 @@ class RequestsManager(object):
         self.password = self.config['password']
         self.token_expiration_sec = int(self.config['token_expiration_sec'])
         self.timeout = None if self.config['timeout'] is None else int(self.config['timeout'])
+        self.session_pool_size = int(self.config.get('session_pool_size', 4))
+        self.session_connections = int(self.config.get('session_connections', 10))
+        self.session_max_age_sec = self.config.get('session_max_age_sec', None)
+        if self.session_max_age_sec is not None:
+            self.session_max_age_sec = int(self.session_max_age_sec)
+
+        # Persistent HTTP sessions
+        self.session_pool = SessionPool(
+            size=self.session_pool_size,
+            connections=self.session_connections,
+            max_age_sec=self.session_max_age_sec
+        )
 
         # Request token
         self.token = None
         self.token_created = datetime.utcfromtimestamp(0)
         self._lock = threading.Lock()
 
+    def close(self):
+        """Close persistent HTTP sessions"""
+        self.session_pool.close()
+
+    def create_session(self):
+        """Return new session outside of the session pool. Pass it as the
+        `session` keyword of a request that waits a long time, so it does
+        not keep a pooled session checked out.
+        """
+        return self.session_pool.create_session()
+
     def get(self, *args, **kwargs):
-        return self._send_request(requests.get, *args, **kwargs)
+        return self._send_request('get', *args, **kwargs)
 
     def get_json(self, *args, **kwargs):
-        return self._send_request_json(requests.get, *args, **kwargs)
+        return self._send_request_json('get', *args, **kwargs)
 
     def post(self, *args, **kwargs):
-        return self._send_request(requests.post, *args, **kwargs)
+        return self._send_request('post', *args, **kwargs)
 
     def post_json(self, *args, **kwargs):
-        return self._send_request_json(requests.post, *args, **kwargs)
+        return self._send_request_json('post', *args, **kwargs)
 
     def delete(self, *args, **kwargs):
-        return self._send_request(requests.delete, *args, **kwargs)
+        return self._send_request('delete', *args, **kwargs)
+
+    def delete_json(self, *args, **kwargs):
+        return self._send_request_json('delete', *args, **kwargs)
 
     def get_file_stream(self, url, start=0, stop=None):
         headers = {}
@@ -68,9 +152,15 @@ class RequestsManager(object):
         headers['Authorization'] = 'Token %s' % self.token
         kwargs.update({'headers': headers})
 
-        # Send request
+        # Send request on given session or a pooled session
+        session = kwargs.pop('session', None)
+        kwargs.setdefault('timeout', self.timeout)
         try:
-            r = method(timeout=self.timeout, *args, **kwargs)
+            if session is not None:
+                r = session.request(method, *args, **kwargs)
+            else:
+                with self.session_pool.session() as session:
+                    r = session.request(method, *args, **kwargs)
         except requests.RequestException:
             log.exception('Request exception')
             return None
@@ -108,13 +198,14 @@ class RequestsManager(object):
 
     def _request_new_token(self):
         # Send post request to dasdremote
-        r = requests.post(
-            self.token_url,
-            data={
-                'username': self.username,
-                'password': self.password
-            }
-        )
+        with self.session_pool.session() as session:
+            r = session.post(
+                self.token_url,
+                data={
+                    'username': self.username,
+                    'password': self.password
+                }
+            )
 
         if r.status_code != requests.codes.ok:
             # Request error
@@ -47,10 +47,10 @@ class WorkerManager(object):
         database manager
         """
         for cls in self._get_all_one_time_query_functions():
-            function = cls().run_do_query
+            function = cls(config=self.config).run_do_query
             self.database_manager.register_one_time_function(function)
         for cls in self._get_all_periodic_query_functions():
-            function = cls().run_do_query
+            function = cls(config=self.config).run_do_query
             self.database_manager.register_periodic_function(function)
 
     def _start_worker_groups(self):
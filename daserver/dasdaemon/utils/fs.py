@@ -4,6 +4,12 @@ import grp
 import os
 import pwd
 import shutil
+import struct
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 def mkdir_p(dirpath):
@@ -65,6 +71,17 @@ def rm_rf(path):
     elif os.path.isfile(path):
         os.remove(path)
 
+def get_file_id(path):
+    """Return tuple of device, inode, size, and modification time in
+    nanoseconds of file, which changes if the file is replaced or written
+    """
+    stat = os.stat(path)
+    mtime_ns = getattr(stat, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        # Python 2 only has float modification time
+        mtime_ns = int(stat.st_mtime * 1000000000)
+    return stat.st_dev, stat.st_ino, stat.st_size, mtime_ns
+
 def write_random_file(filepath, size_bytes, block_size=4096):
     """Write random file with bytes from os.urandom"""
     with open(filepath, 'wb') as output_file:
@@ -74,30 +91,101 @@ def write_random_file(filepath, size_bytes, block_size=4096):
             output_file.write(os.urandom(block_size))
             size_bytes -= block_size
 
+# Linux ioctl to share the extents of a file range with another file:
+# struct file_clone_range { s64 src_fd; u64 src_offset; u64 src_length; u64 dest_offset; }
+FICLONERANGE = 0x4020940d
+
+# Errors from kernel copies that mean the files do not support them
+_KERNEL_COPY_UNSUPPORTED_ERRNOS = set([
+    errno.EINVAL, errno.ENOSYS, errno.EXDEV, errno.EOPNOTSUPP, errno.EBADF
+])
+
+def _kernel_copy(in_fd, out_fd, in_offset, out_offset, count):
+    """Copy up to count bytes between file descriptors in the kernel.
+    Return bytes copied, 0 at end of input.
+    """
+    if hasattr(os, 'copy_file_range'):
+        return os.copy_file_range(in_fd, out_fd, count, in_offset, out_offset)
+    # sendfile writes at the current output file position
+    os.lseek(out_fd, out_offset, os.SEEK_SET)
+    return os.sendfile(out_fd, in_fd, in_offset, count)
+
+def _buffered_copy(in_file, out_file, count, buffer_size):
+    """Copy up to count bytes, or to end of file if count is None, through
+    one reused buffer. Return bytes copied.
+    """
+    buf = bytearray(buffer_size)
+    view = memoryview(buf)
+    copied = 0
+    while count is None or copied < count:
+        size = buffer_size if count is None else min(buffer_size, count - copied)
+        n = in_file.readinto(view[:size])
+        if not n:
+            break
+        out_file.write(view[:n])
+        copied += n
+    return copied
+
+def copy_file_data(in_file, out_file, count=None, buffer_size=1024*1024):
+    """Copy up to count bytes, or to end of file if count is None, from the
+    current position of in_file to the current position of out_file.
+    Bytes are copied in the kernel with copy_file_range or sendfile if
+    available, otherwise through one reused buffer. Return bytes copied.
+    """
+    if not (hasattr(os, 'copy_file_range') or hasattr(os, 'sendfile')):
+        return _buffered_copy(in_file, out_file, count, buffer_size)
+    try:
+        in_fd = in_file.fileno()
+        out_fd = out_file.fileno()
+    except (AttributeError, IOError, ValueError):
+        # Not backed by file descriptors
+        return _buffered_copy(in_file, out_file, count, buffer_size)
+
+    out_file.flush()
+    in_offset = in_file.tell()
+    out_offset = out_file.tell()
+    copied = 0
+    try:
+        while count is None or copied < count:
+            size = buffer_size * 64 if count is None else min(buffer_size * 64, count - copied)
+            n = _kernel_copy(in_fd, out_fd, in_offset + copied, out_offset + copied, size)
+            if not n:
+                break
+            copied += n
+    except OSError as exc:
+        if exc.errno not in _KERNEL_COPY_UNSUPPORTED_ERRNOS:
+            raise
+        # Copy the rest in userspace
+        in_file.seek(in_offset + copied)
+        out_file.seek(out_offset + copied)
+        remaining = None if count is None else count - copied
+        return copied + _buffered_copy(in_file, out_file, remaining, buffer_size)
+
+    # Kernel copies do not move the file object positions
+    in_file.seek(in_offset + copied)
+    out_file.seek(out_offset + copied)
+    return copied
+
 def split_file(filepath, output_dir, split_size=4096):
     """Split file into multiple files of the same size"""
     if not os.path.isfile(filepath):
         raise ValueError('filepath is not a file')
     basename = os.path.basename(filepath)
+    filesize = os.path.getsize(filepath)
 
     part_num = 0
     split_files = []
     with open(filepath, 'rb') as in_file:
-        while True:
-            # Read file chunk
-            chunk = in_file.read(split_size)
-            if not chunk:
-                break
-
+        while in_file.tell() < filesize:
             # Get split file path
             split_filepath = os.path.join(
                 output_dir,
                 '%s.%04d' % (basename, part_num)
             )
 
-            # Write chunk to split file
+            # Copy chunk to split file
             with open(split_filepath, 'wb') as out_file:
-                out_file.write(chunk)
+                copy_file_data(in_file, out_file, split_size)
 
             # Add split file to list
             split_files.append(os.path.basename(split_filepath))
@@ -107,16 +195,103 @@ def split_file(filepath, output_dir, split_size=4096):
 
     return split_files
 
-def join_files(output_filename, source_dir, source_filenames):
+def clone_file(in_file, out_file):
+    """Append contents of in_file to out_file at its current position by
+    sharing extents with a reflink, on filesystems that support it (btrfs,
+    XFS). The output position must be block aligned. Return True if the
+    file was cloned, False if nothing was written.
+    """
+    if fcntl is None:
+        return False
+    try:
+        out_file.flush()
+        out_offset = out_file.tell()
+        length = os.fstat(in_file.fileno()).st_size
+        if out_offset % os.fstat(out_file.fileno()).st_blksize != 0:
+            return False
+        if length > 0:
+            fcntl.ioctl(
+                out_file.fileno(), FICLONERANGE,
+                struct.pack('=qQQQ', in_file.fileno(), 0, length, out_offset)
+            )
+    except (AttributeError, IOError, OSError, ValueError):
+        # Not supported by the filesystem or the file objects
+        return False
+    out_file.seek(out_offset + length)
+    return True
+
+def join_files(output_filename, source_dir, source_filenames, allow_link=False):
     """Open output file for binary writing, loop
-    through source files in order, and write
-    their contents to output file
+    through source files in order, and copy
+    their contents to output file. Source files
+    are reflinked instead of copied if supported.
+    If allow_link is True, a single source file
+    is hard linked as the output file instead.
     """
+    if allow_link and len(source_filenames) == 1:
+        try:
+            rm_rf(output_filename)
+            os.link(os.path.join(source_dir, source_filenames[0]), output_filename)
+            return
+        except OSError:
+            # Hard links not supported, so join normally
+            pass
+
+    reflink = True
     with open(output_filename, 'wb') as output_file:
         for filename in source_filenames:
             filepath = os.path.join(source_dir, filename)
             with open(filepath, 'rb') as input_file:
-                shutil.copyfileobj(input_file, output_file)
+                if reflink and clone_file(input_file, output_file):
+                    continue
+                # Output is no longer aligned, or reflinks are not supported
+                reflink = False
+                copy_file_data(input_file, output_file)
+
+class ConcatenatedFile(object):
+    """Read-only file object that presents a sequence of files as one
+    sequential stream. Files are opened in order as the previous one is
+    exhausted.
+    """
+
+    def __init__(self, filepaths):
+        self._filepaths = iter(filepaths)
+        self._file = None
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def read(self, size=-1):
+        """Read up to size bytes across file boundaries. Read until the
+        last file is exhausted if size is negative.
+        """
+        chunks = []
+        while size != 0:
+            if self._file is None:
+                try:
+                    self._file = open(next(self._filepaths), 'rb')
+                except StopIteration:
+                    break
+            chunk = self._file.read(size)
+            if not chunk:
+                # Move to next file
+                self._file.close()
+                self._file = None
+                continue
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b''.join(chunks)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.closed = True
 
 def get_user_from_uid(uid):
     """Get username from user ID"""
@@ -1,16 +1,16 @@
 """Hashing functions utility module"""
 import hashlib
+import os
 
 
-def md5_file(filepath, block_size=4096):
+# Large reads keep hashing many package files from being syscall bound
+DEFAULT_BLOCK_SIZE = 1024*1024
+
+
+def md5_file(filepath, block_size=DEFAULT_BLOCK_SIZE):
     """Calculate MD5 of file"""
     md5 = hashlib.md5()
-    with open(filepath, 'rb') as in_file:
-        while True:
-            chunk = in_file.read(block_size)
-            if not chunk:
-                break
-            md5.update(chunk)
+    update_file(md5, filepath, block_size)
     return md5.hexdigest()
 
 def md5_bytes(bytestring):
@@ -19,15 +19,10 @@ def md5_bytes(bytestring):
     md5.update(bytestring)
     return md5.hexdigest()
 
-def sha256_file(filepath, block_size=4096):
+def sha256_file(filepath, block_size=DEFAULT_BLOCK_SIZE):
     """Calculate SHA256 of file"""
     sha256 = hashlib.sha256()
-    with open(filepath, 'rb') as in_file:
-        while True:
-            chunk = in_file.read(block_size)
-            if not chunk:
-                break
-            sha256.update(chunk)
+    update_file(sha256, filepath, block_size)
     return sha256.hexdigest()
 
 def sha256_bytes(bytestring):
@@ -35,3 +30,58 @@ def sha256_bytes(bytestring):
     sha256 = hashlib.sha256()
     sha256.update(bytestring)
     return sha256.hexdigest()
+
+def digest_file(filepath, algorithms=('md5', 'sha256'), block_size=DEFAULT_BLOCK_SIZE):
+    """Calculate several hashes of file in one pass. Return dict
+    of hex digests keyed by algorithm name.
+    """
+    hash_objs = [hashlib.new(algorithm) for algorithm in algorithms]
+    update_file_multi(hash_objs, filepath, block_size)
+    return dict(zip(algorithms, [hash_obj.hexdigest() for hash_obj in hash_objs]))
+
+def update_file(hash_obj, filepath, block_size=DEFAULT_BLOCK_SIZE):
+    """Update hash object with contents of file"""
+    update_file_multi([hash_obj], filepath, block_size)
+    return hash_obj
+
+def update_file_multi(hash_objs, filepath, block_size=DEFAULT_BLOCK_SIZE):
+    """Update hash objects with contents of file, reading each
+    block once into a reused buffer
+    """
+    buf = bytearray(block_size)
+    with open(filepath, 'rb') as in_file:
+        while True:
+            num_bytes = in_file.readinto(buf)
+            if not num_bytes:
+                break
+            # Only a short read needs a copy of the filled part of the buffer
+            chunk = buf if num_bytes == block_size else buf[:num_bytes]
+            for hash_obj in hash_objs:
+                hash_obj.update(chunk)
+    return hash_objs
+
+def verify_file(path, filesize, sha256, block_size=DEFAULT_BLOCK_SIZE):
+    """Verify size and SHA256 of file. Return tuple of whether file
+    is verified, its size, and its SHA256. File is not hashed if its
+    size is wrong, and size is None if file can't be read.
+    """
+    try:
+        actual_filesize = os.path.getsize(path)
+        if actual_filesize != filesize:
+            return False, actual_filesize, None
+        actual_sha256 = sha256_file(path, block_size)
+    except (IOError, OSError):
+        return False, None, None
+    return actual_sha256 == sha256, actual_filesize, actual_sha256
+
+def _verify_file_args(args):
+    return verify_file(*args)
+
+def verify_files(files, pool=None):
+    """Verify batch of (path, filesize, sha256) tuples, in parallel
+    if a thread or process pool is given. Return list of verify_file
+    results in order.
+    """
+    if pool is None:
+        return [_verify_file_args(args) for args in files]
+    return pool.map(_verify_file_args, files)
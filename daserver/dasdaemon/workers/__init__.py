@@ -12,7 +12,10 @@ from dasdaemon.workers.package_downloader import (
     PackageDownloaderPeriodicQueryFunction
 )
 
-from dasdaemon.workers.package_extractor import PackageExtractor
+from dasdaemon.workers.package_extractor import (
+    PackageExtractor,
+    PackageExtractorPeriodicQueryFunction
+)
 
 from dasdaemon.workers.packaged_torrent_lister import (
     PackagedTorrentLister,
@@ -21,4 +24,9 @@ from dasdaemon.workers.packaged_torrent_lister import (
 
 from dasdaemon.workers.packaged_torrent_monitor import PackagedTorrentMonitor
 
+from dasdaemon.workers.torrent_deleter import (
+    TorrentDeleter,
+    TorrentDeleterPeriodicQueryFunction
+)
+
 import dasdaemon.workers.error
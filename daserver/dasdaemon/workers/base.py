@@ -245,6 +245,9 @@ class DaSDWorkerGroup(object):
 
 class DaSDQueryFunction(object):
 
+    def __init__(self, config=None):
+        self.config = config
+
     def do_query(self):
         # Subclass must implement this function
         raise NotImplementedError
@@ -255,7 +258,8 @@ class DaSDQueryFunction(object):
 
 class DaSDOneTimeQueryFunction(DaSDQueryFunction):
 
-    def __init__(self):
+    def __init__(self, config=None):
+        super(DaSDOneTimeQueryFunction, self).__init__(config=config)
         self._done = False
 
     def run_do_query(self):
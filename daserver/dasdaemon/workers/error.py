@@ -1,8 +1,8 @@
+from django.db.models import F
 from django.utils import timezone
 
 from dasdaemon.workers import DaSDPeriodicQueryFunction
 from dasdapi.models import PackageFile, Torrent
-from dasdapi.stages import PackageFileStage, TorrentStage
 
 
 class ErrorHandlerPeriodicQueryFunction(DaSDPeriodicQueryFunction):
@@ -12,22 +12,14 @@ class ErrorHandlerPeriodicQueryFunction(DaSDPeriodicQueryFunction):
         self._handle_package_files()
 
     def _handle_torrents(self):
-        # Get all Torrents in error stage
-        torrents = Torrent.objects.filter(stage='Error')
-
-        # Get current time
+        """After the retry delay passes for the most recent error, move
+        torrents from error stage back to the stage where the error
+        occurred
+        """
         now = timezone.now()
-
-        for torrent in torrents:
-            # Get time delta between error time and now
-            error = torrent.errors.first()
-            time_delta = now - error.time
-
-            if time_delta.total_seconds() > error.retry_delay:
-                # Torrent has been in error stage long enough
-                # Move back to previous completed stage to retry
-                torrent.stage = TorrentStage(error.stage).previous_completed().name
-                torrent.save()
+        Torrent.objects\
+            .filter(stage='Error', next_retry_at__lte=now)\
+            .update(stage=F('retry_stage'), next_retry_at=None, last_modified=now)
 
     def _handle_package_files(self):
         """After the retry delay passes for the most recent error, move
@@ -35,12 +27,6 @@ class ErrorHandlerPeriodicQueryFunction(DaSDPeriodicQueryFunction):
         occurred
         """
         now = timezone.now()
-        for package_file in PackageFile.objects.filter(stage='Error'):
-            error = package_file.errors.first()
-            time_delta = now - error.time
-
-            if time_delta.total_seconds() > error.retry_delay:
-                # Package file has been in error stage long enough
-                # Move back to previous completed stage to retry
-                package_file.stage = PackageFileStage(error.stage).previous_completed().name
-                package_file.save()
+        PackageFile.objects\
+            .filter(stage='Error', next_retry_at__lte=now)\
+            .update(stage=F('retry_stage'), next_retry_at=None)
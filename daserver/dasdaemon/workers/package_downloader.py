@@ -1,8 +1,16 @@
 """Package Downloader"""
+import hashlib
+import json
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 import os
+from Queue import Empty
 import requests
 import threading
 
+from django.db.models import Case, Count, F, When
+from django.utils import timezone
+
 from dasdaemon.exceptions import DaSDError, PackageDownloadError
 from dasdaemon.logger import log
 from dasdaemon.workers import (
@@ -11,7 +19,7 @@ from dasdaemon.workers import (
     DaSDPeriodicQueryFunction
 )
 import dasdaemon.utils as utils
-from dasdapi.models import PackageFile, Torrent
+from dasdapi.models import PackageFile, Torrent, VerifiedPackageFile
 
 
 class PackageDownloaderOneTimeQueryFunction(DaSDOneTimeQueryFunction):
@@ -35,41 +43,45 @@ class PackageDownloaderPeriodicQueryFunction(DaSDPeriodicQueryFunction):
         """Find torrents at ready stage. If torrent has any package files
         processing, then move torrent to the processing stage
         """
-        torrents = Torrent.objects.filter(
-            stage=PackageDownloader.ready_stage()
-        )
-
-        for torrent in torrents:
-            count = PackageFile.objects\
-                .filter(
-                    torrent=torrent,
-                    stage=PackageDownloader.package_file_processing_stage()
-                )\
-                .count()
-
-            if count > 0:
-                torrent.stage = PackageDownloader.processing_stage()
-                torrent.save()
+        processing_package_files = PackageFile.objects\
+            .filter(stage=PackageDownloader.package_file_processing_stage())\
+            .values('torrent_id')
+
+        Torrent.objects\
+            .filter(
+                stage=PackageDownloader.ready_stage(),
+                id__in=processing_package_files
+            )\
+            .update(
+                stage=PackageDownloader.processing_stage(),
+                last_modified=timezone.now()
+            )
 
     def _move_torrents_to_completed_stage(self):
         """Find torrents at processing stage. If torrent has all completed
         package files, then move torrent to completed stage.
         """
-        torrents = Torrent.objects.filter(
-            stage=PackageDownloader.processing_stage()
-        )
-
-        for torrent in torrents:
-            count = PackageFile.objects\
-                .filter(
-                    torrent=torrent,
-                    stage=PackageDownloader.package_file_completed_stage()
-                )\
-                .count()
-
-            if count == torrent.package_files_count:
-                torrent.stage = PackageDownloader.completed_stage()
-                torrent.save()
+        torrent_ids = Torrent.objects\
+            .filter(stage=PackageDownloader.processing_stage())\
+            .annotate(
+                completed_count=Count(
+                    Case(
+                        When(
+                            package_file_set__stage=PackageDownloader.package_file_completed_stage(),
+                            then=1
+                        )
+                    )
+                )
+            )\
+            .filter(completed_count=F('package_files_count'))\
+            .values_list('id', flat=True)
+
+        Torrent.objects\
+            .filter(id__in=list(torrent_ids))\
+            .update(
+                stage=PackageDownloader.completed_stage(),
+                last_modified=timezone.now()
+            )
 
 
 class PackageDownloader(DaSDWorker):
@@ -83,11 +95,20 @@ class PackageDownloader(DaSDWorker):
     # Lock to synchronize multiple threads modifying database
     lock = threading.Lock()
 
+    # Thread pool shared by all workers to hash package files. Hashing
+    # large blocks releases the GIL, so threads use all cores.
+    _verify_pool = None
+
     def __init__(self, *args, **kwargs):
         super(PackageDownloader, self).__init__(*args, **kwargs)
 
         # Parse config
         self.download_url = self.worker_config['download_url']
+        self.segments = int(self.worker_config.get('segments', 1))
+        self.segment_min_bytes = int(self.worker_config.get('segment_min_bytes', 16777216))
+        self.segment_progress_bytes = int(self.worker_config.get('segment_progress_bytes', 1048576))
+        self.verify_threads = int(self.worker_config.get('verify_threads', multiprocessing.cpu_count()))
+        self.verify_batch_size = int(self.worker_config.get('verify_batch_size', 1))
 
     def do_work(self):
         # Get package file from queue
@@ -97,6 +118,12 @@ class PackageDownloader(DaSDWorker):
             log.debug('Package file is None')
             return
 
+        # Verify package files that are already complete on disk together,
+        # such as when resuming many package files after a restart
+        if self.verify_batch_size > 1 and self._is_complete(package_file):
+            self._complete_package_files(self._get_batch(package_file))
+            return
+
         # Download package file
         try:
             self._download_package_file(package_file)
@@ -104,6 +131,51 @@ class PackageDownloader(DaSDWorker):
             log.exception(exc)
             package_file.set_error(exc)
 
+    def _get_batch(self, package_file):
+        """Return list of `package_file` and the package files at the head
+        of the queue that are also complete on disk, up to the verify batch
+        size. Other package files are left in the queue, so the queue keeps
+        its download order.
+        """
+        package_files = [package_file]
+        while len(package_files) < self.verify_batch_size:
+            try:
+                # Sentinel object belongs to another worker, so leave it
+                package_file = self.package_file_queue.get_if(
+                    lambda pf: pf is not None and self._is_complete(pf)
+                )
+            except Empty:
+                break
+            package_files.append(package_file)
+        return package_files
+
+    def _is_complete(self, package_file):
+        """Return true if package file has its full size on disk and is not
+        a preallocated segmented download
+        """
+        torrent = package_file.torrent
+        return (
+            self._get_local_filesize(torrent, package_file) == package_file.filesize and
+            not os.path.isfile(self._get_segments_path(torrent, package_file))
+        )
+
+    def _complete_package_files(self, package_files):
+        """Verify package files in parallel, then move verified package
+        files to completed stage and remove the others
+        """
+        verified = self._verify_package_files(package_files)
+        for package_file, is_verified in zip(package_files, verified):
+            if not is_verified:
+                utils.fs.rm_rf(self.path_manager.get_package_file_path(package_file.torrent, package_file))
+                exc = PackageDownloadError('Failed to verify package file: %s' % package_file.filename)
+                log.error(exc)
+                package_file.set_error(exc)
+                continue
+
+            log.info('Verified: %s', package_file.filename)
+            package_file.stage = self.package_file_completed_stage()
+            package_file.save()
+
     def _download_package_file(self, package_file):
         """Get file download stream and write to file, resuming if necessary"""
         # Get torrent and create package files directory
@@ -112,22 +184,28 @@ class PackageDownloader(DaSDWorker):
 
         # Check local filesize
         filesize = self._get_local_filesize(torrent, package_file)
-        if package_file.filesize != filesize:
+        sha256 = None
+        if self._use_segments(torrent, package_file, filesize):
+            # Download byte ranges concurrently
+            self._download_segments(torrent, package_file)
+        elif package_file.filesize != filesize:
             # Get file stream request
             req = self.requests_manager.get_file_stream(
                 self._get_request_url(package_file),
-                start=self._get_local_filesize(torrent, package_file)
+                start=filesize
             )
 
             if req is None:
                 raise PackageDownloadError('Request failed: %s', package_file.filename)
 
             try:
-                # Write file stream request to file
-                self._write_request_to_file(
-                    req,
-                    self.path_manager.get_package_file_path(torrent, package_file)
-                )
+                # Hash existing part of file when resuming, then hash
+                # file stream request while writing it to file
+                path = self.path_manager.get_package_file_path(torrent, package_file)
+                sha256 = hashlib.sha256()
+                if filesize > 0:
+                    utils.hash.update_file(sha256, path)
+                self._write_request_to_file(req, path, sha256=sha256)
                 self.path_manager.chownmod_package_file(torrent, package_file)
             except Exception as exc:
                 message = 'Failed to download package file: %s: %s' % (package_file.filename, exc)
@@ -136,7 +214,7 @@ class PackageDownloader(DaSDWorker):
                 log.info('Downloaded: %s', package_file.filename)
 
         # Verify package file
-        if not self._verify_package_file(torrent, package_file):
+        if not self._verify_package_file(torrent, package_file, sha256):
             # Remove package file
             utils.fs.rm_rf(self.path_manager.get_package_file_path(torrent, package_file))
             raise PackageDownloadError('Failed to verify package file: %s' % package_file.filename)
@@ -147,6 +225,127 @@ class PackageDownloader(DaSDWorker):
         package_file.stage = self.package_file_completed_stage()
         package_file.save()
 
+    def _use_segments(self, torrent, package_file, filesize):
+        """Use segmented mode for large package files that are new or were
+        partially downloaded in segmented mode
+        """
+        if os.path.isfile(self._get_segments_path(torrent, package_file)):
+            return True
+        return (
+            self.segments > 1 and
+            filesize == 0 and
+            package_file.filesize >= self.segment_min_bytes
+        )
+
+    def _download_segments(self, torrent, package_file):
+        """Download byte ranges of package file concurrently into a
+        preallocated file. Progress of each segment is saved next to the
+        package file, so a resumed download only fetches missing bytes.
+        """
+        path = self.path_manager.get_package_file_path(torrent, package_file)
+        segments_path = self._get_segments_path(torrent, package_file)
+        segments = self._load_segments(segments_path, package_file)
+
+        try:
+            # Preallocate file
+            if not os.path.isfile(path):
+                with open(path, 'wb') as out_file:
+                    out_file.truncate(package_file.filesize)
+                self._save_segments(segments_path, segments)
+
+            # Download segments
+            url = self._get_request_url(package_file)
+            errors = []
+            lock = threading.Lock()
+            threads = [
+                threading.Thread(
+                    target=self._download_segment,
+                    name='%s-segment-%d' % (self.name, i),
+                    args=(url, path, segments_path, segments, segment, lock, errors)
+                )
+                for i, segment in enumerate(segments)
+                if segment['offset'] <= segment['stop']
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if errors:
+                raise errors[0]
+
+            self.path_manager.chownmod_package_file(torrent, package_file)
+        except Exception as exc:
+            message = 'Failed to download package file: %s: %s' % (package_file.filename, exc)
+            raise PackageDownloadError(message)
+        else:
+            utils.fs.rm_rf(segments_path)
+            log.info('Downloaded: %s (%d segments)', package_file.filename, len(segments))
+
+    def _download_segment(self, url, path, segments_path, segments, segment, lock, errors):
+        """Write byte range of file stream at its position in the file.
+        Segment progress is saved after every `segment_progress_bytes`
+        written bytes are flushed, and when the segment finishes, so a
+        killed download only fetches the last unsaved bytes again.
+        """
+        offset = segment['offset']
+        try:
+            # Raises an exception if the request fails
+            req = self.requests_manager.get_file_stream(
+                url,
+                start=offset,
+                stop=segment['stop']
+            )
+
+            with open(path, 'r+b') as out_file:
+                out_file.seek(offset)
+                saved_offset = offset
+                for chunk in req.iter_content(chunk_size=4096):
+                    if chunk:
+                        out_file.write(chunk)
+                        offset += len(chunk)
+                        if offset - saved_offset >= self.segment_progress_bytes:
+                            out_file.flush()
+                            with lock:
+                                segment['offset'] = offset
+                                self._save_segments(segments_path, segments)
+                            saved_offset = offset
+        except Exception as exc:
+            log.exception('Failed to download segment: %s: %d-%d', url, segment['start'], segment['stop'])
+            with lock:
+                errors.append(exc)
+        finally:
+            with lock:
+                segment['offset'] = offset
+                self._save_segments(segments_path, segments)
+
+    def _get_segments(self, filesize):
+        """Split filesize into byte ranges. Each segment stores its first
+        and last byte, and the offset of the next byte to download.
+        """
+        segment_size = -(-filesize // self.segments)
+        return [
+            {
+                'start': start,
+                'stop': min(start + segment_size, filesize) - 1,
+                'offset': start
+            }
+            for start in xrange(0, filesize, segment_size)
+        ]
+
+    def _get_segments_path(self, torrent, package_file):
+        return self.path_manager.get_package_file_path(torrent, package_file) + '.segments'
+
+    def _load_segments(self, segments_path, package_file):
+        try:
+            with open(segments_path, 'r') as in_file:
+                return json.load(in_file)
+        except (IOError, ValueError):
+            return self._get_segments(package_file.filesize)
+
+    def _save_segments(self, segments_path, segments):
+        with open(segments_path, 'w') as out_file:
+            json.dump(segments, out_file)
+
     def _get_request_url(self, package_file):
         return self.download_url + package_file.filename
 
@@ -157,18 +356,120 @@ class PackageDownloader(DaSDWorker):
             # File does not exist
             return 0
 
-    def _write_request_to_file(self, req, path, mode='ab'):
-        """Write request to file in chunks"""
+    def _write_request_to_file(self, req, path, mode='ab', sha256=None):
+        """Write request to file in chunks, updating hash object with each
+        chunk if given
+        """
         with open(path, mode) as out_file:
             for chunk in req.iter_content(chunk_size=4096):
                 if chunk:
                     out_file.write(chunk)
+                    if sha256 is not None:
+                        sha256.update(chunk)
+
+    def _get_verify_pool(self):
+        with self.lock:
+            if PackageDownloader._verify_pool is None:
+                PackageDownloader._verify_pool = ThreadPool(self.verify_threads)
+            return PackageDownloader._verify_pool
+
+    def _get_file_id(self, path):
+        try:
+            return utils.fs.get_file_id(path)
+        except OSError:
+            # File does not exist
+            return None
+
+    def _is_verified_unchanged(self, package_file, file_id, verified_package_file):
+        """Return true if package file was verified before and its file on
+        disk has not changed since
+        """
+        return (
+            file_id is not None and
+            verified_package_file is not None and
+            verified_package_file.get_file_id() == file_id and
+            verified_package_file.sha256 == package_file.sha256
+        )
+
+    def _save_verified(self, package_file, file_id, sha256):
+        """Save SHA256 of verified package file with the identity of its
+        file on disk
+        """
+        if file_id is None:
+            return
+        dev, inode, size, mtime_ns = file_id
+        VerifiedPackageFile.objects.update_or_create(
+            package_file=package_file,
+            defaults={
+                'dev': dev,
+                'inode': inode,
+                'size': size,
+                'mtime_ns': mtime_ns,
+                'sha256': sha256
+            }
+        )
+
+    def _verify_package_files(self, package_files):
+        """Verify size and SHA256 of package files on the shared thread
+        pool. Package files that were verified before and did not change
+        on disk are not hashed again. Return list of whether each package
+        file is verified.
+        """
+        paths = [
+            self.path_manager.get_package_file_path(package_file.torrent, package_file)
+            for package_file in package_files
+        ]
+        file_ids = [self._get_file_id(path) for path in paths]
+        verified_package_files = dict(
+            (verified_package_file.package_file_id, verified_package_file)
+            for verified_package_file in VerifiedPackageFile.objects.filter(package_file__in=package_files)
+        )
+
+        # Hash package files that are not verified already
+        results = [None] * len(package_files)
+        hash_indexes = []
+        for i, package_file in enumerate(package_files):
+            if self._is_verified_unchanged(package_file, file_ids[i], verified_package_files.get(package_file.id)):
+                log.debug('Verified unchanged: %s', package_file.filename)
+                results[i] = (True, package_file.filesize, package_file.sha256)
+            else:
+                hash_indexes.append(i)
+
+        hash_results = utils.hash.verify_files(
+            [
+                (paths[i], package_files[i].filesize, package_files[i].sha256)
+                for i in hash_indexes
+            ],
+            pool=self._get_verify_pool()
+        )
+        for i, result in zip(hash_indexes, hash_results):
+            results[i] = result
+            if result[0]:
+                self._save_verified(package_files[i], file_ids[i], result[2])
+
+        verified = []
+        for package_file, (is_verified, filesize, sha256) in zip(package_files, results):
+            if filesize is None:
+                log.error('Failed to get package file properties: %s', package_file.filename)
+            elif package_file.filesize != filesize:
+                log.error('Package file: %s: %d != %d', package_file.filename, package_file.filesize, filesize)
+            elif not is_verified:
+                log.error('Package file: %s: %s != %s', package_file.filename, package_file.sha256, sha256)
+            verified.append(is_verified)
+        return verified
+
+    def _verify_package_file(self, torrent, package_file, sha256=None):
+        """Verify package file size and SHA256. If a hash object computed
+        during the download is given, then the file is not read again.
+        """
+        if sha256 is None:
+            return self._verify_package_files([package_file])[0]
 
-    def _verify_package_file(self, torrent, package_file):
         # Get package file properties
         try:
+            file_id = self._get_file_id(self.path_manager.get_package_file_path(torrent, package_file))
             filesize = self._get_local_filesize(torrent, package_file)
-            sha256 = utils.hash.sha256_file(self.path_manager.get_package_file_path(torrent, package_file))
+            sha256 = sha256.hexdigest()
         except:
             log.exception('Failed to get package file properties')
             return False
@@ -180,4 +481,5 @@ class PackageDownloader(DaSDWorker):
         if package_file.sha256 != sha256:
             log.error('Package file: %s: %s != %s', package_file.filename, package_file.sha256, sha256)
             return False
+        self._save_verified(package_file, file_id, sha256)
         return True
@@ -1,12 +1,16 @@
 import os
 import tarfile
 import threading
+import time
+
+from django.utils import timezone
 
 from dasdaemon.exceptions import DaSDError, PackageExtractorError
 from dasdaemon.logger import log
-from dasdaemon.workers import DaSDWorker
+from dasdaemon.workers import DaSDWorker, DaSDPeriodicQueryFunction
 import dasdaemon.utils as utils
 from dasdapi.models import PackageFile, Torrent
+from dasdapi.stages import TorrentStage
 
 
 '''
@@ -26,6 +30,30 @@ from dasdapi.models import PackageFile, Torrent
 '''
 
 
+def is_pipelined(worker_config):
+    """Return True if package files are extracted while the rest of the
+    torrent is still downloading. Only supported in stream mode.
+    """
+    return (
+        worker_config.get('extract_mode', 'stream') == 'stream' and
+        worker_config.get('pipelined', 'false').lower() == 'true'
+    )
+
+
+class PackageExtractorPeriodicQueryFunction(DaSDPeriodicQueryFunction):
+
+    def do_query(self):
+        """In pipelined mode, move torrents that started downloading to the
+        ready stage, so extraction starts with the first package file.
+        """
+        if self.config is None or not is_pipelined(self.config.get('PackageExtractor', {})):
+            return
+
+        Torrent.objects\
+            .filter(stage=TorrentStage(PackageExtractor.ready_stage()).previous().name)\
+            .update(stage=PackageExtractor.ready_stage(), last_modified=timezone.now())
+
+
 class PackageExtractor(DaSDWorker):
 
     torrent_stage_name = 'Extracting'
@@ -35,6 +63,18 @@ class PackageExtractor(DaSDWorker):
     def __init__(self, *args, **kwargs):
         super(PackageExtractor, self).__init__(*args, **kwargs)
 
+        # Parse config
+        # stream: Extract directly from package files
+        # join: Join package files into package archive and extract it
+        self.extract_mode = self.worker_config.get('extract_mode', 'stream')
+
+        # Pipelined stream mode: Wait for each package file to finish
+        # downloading before reading it, until it makes no progress for the
+        # stall timeout
+        self.pipelined = is_pipelined(self.worker_config)
+        self.pipeline_poll_sec = float(self.worker_config.get('pipeline_poll_sec', 1))
+        self.pipeline_stall_timeout_sec = float(self.worker_config.get('pipeline_stall_timeout_sec', 300))
+
     def do_work(self):
         # Get torrent from queue
         torrent = self.torrent_queue.get()
@@ -67,7 +107,8 @@ class PackageExtractor(DaSDWorker):
         utils.fs.join_files(
             output_filename=package_archive,
             source_dir=package_files_dir,
-            source_filenames=[package_file.filename for package_file in package_file_set]
+            source_filenames=[package_file.filename for package_file in package_file_set],
+            allow_link=True
         )
 
         return package_archive, package_file_set
@@ -79,7 +120,76 @@ class PackageExtractor(DaSDWorker):
             package_archive.extractall(path=package_dir)
         self.path_manager.chownmod_package_output_dir(torrent)
 
+    def _extract_package_stream(self, torrent, package_file_set):
+        """Extract package files in order as one tar stream to package
+        directory
+        """
+        package_dir = self.path_manager.create_package_output_dir(torrent)
+        if self.pipelined:
+            package_file_paths = self._wait_for_package_files(torrent, package_file_set)
+        else:
+            package_file_paths = [
+                self.path_manager.get_package_file_path(torrent, package_file)
+                for package_file in package_file_set
+            ]
+        with utils.fs.ConcatenatedFile(package_file_paths) as package_stream:
+            with tarfile.open(fileobj=package_stream, mode='r|*') as package_archive:
+                package_archive.extractall(path=package_dir)
+        self.path_manager.chownmod_package_output_dir(torrent)
+
+    def _wait_for_package_files(self, torrent, package_file_set):
+        """Yield package file paths in order, blocking until each package
+        file has been downloaded and verified. Fail as soon as a package
+        file errors, or when it makes no progress for the stall timeout.
+        """
+        for package_file in package_file_set:
+            path = self.path_manager.get_package_file_path(torrent, package_file)
+            progress = self._get_package_file_progress(package_file, path)
+            stalled_sec = 0
+            while package_file.stage != self.package_file_ready_stage():
+                if package_file.stage == 'Error':
+                    raise PackageExtractorError('Package file failed: %s' % package_file.filename)
+                if self._stop_signal.is_set():
+                    raise PackageExtractorError('Stopped waiting for package file: %s' % package_file.filename)
+                if stalled_sec >= self.pipeline_stall_timeout_sec:
+                    raise PackageExtractorError('Package file stalled: %s' % package_file.filename)
+                time.sleep(self.pipeline_poll_sec)
+                package_file.refresh_from_db()
+
+                # Reset stall timeout when package file makes progress
+                last_progress, progress = progress, self._get_package_file_progress(package_file, path)
+                stalled_sec = 0 if progress != last_progress else stalled_sec + self.pipeline_poll_sec
+            yield path
+
+    def _get_package_file_progress(self, package_file, path):
+        """Return stage and local file id of package file, which change while
+        it is downloading. Preallocated segmented downloads keep their size,
+        so the file id includes the modification time.
+        """
+        try:
+            file_id = utils.fs.get_file_id(path)
+        except OSError:
+            file_id = None
+        return package_file.stage, file_id
+
     def _extract_package(self, torrent):
+        """Get package file set and extract it. Return package file set
+        for further processing.
+        """
+        if self.extract_mode == 'join':
+            return self._join_and_extract_package(torrent)
+
+        package_file_set = self._get_package_file_set(torrent)
+        try:
+            self._extract_package_stream(torrent, package_file_set)
+        except Exception as exc:
+            message = 'Failed to extract package stream: %s: %s' % (torrent.name, exc)
+            log.exception(message)
+            raise PackageExtractorError(message)
+
+        return package_file_set
+
+    def _join_and_extract_package(self, torrent):
         """Get package file set, create package archive, and extract package
         archive. Return package file set for further processing.
         """
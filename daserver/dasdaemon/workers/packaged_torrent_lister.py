@@ -1,5 +1,9 @@
 """Packaged Torrent Lister"""
-from dasdaemon.exceptions import DaSDRequestError
+from Queue import Empty
+
+from django.db import transaction
+
+from dasdaemon.exceptions import DaSDRequestError, PackagedTorrentListerError
 from dasdaemon.logger import log
 from dasdaemon.workers import DaSDWorker, DaSDOneTimeQueryFunction
 from dasdapi.models import PackageFile, Torrent
@@ -35,6 +39,7 @@ class PackagedTorrentLister(DaSDWorker):
 
         # Parse config
         self.package_files_url = self.worker_config['package_files_url']
+        self.batch_size = int(self.worker_config.get('batch_size', 1))
 
     def do_work(self):
         # Get torrent from queue
@@ -44,6 +49,29 @@ class PackagedTorrentLister(DaSDWorker):
             log.debug('Torrent is None')
             return
 
+        if self.batch_size > 1:
+            self._list_torrents(self._get_batch(torrent))
+        else:
+            self._list_torrent(torrent)
+
+    def _get_batch(self, torrent):
+        """Return list of `torrent` and torrents already waiting in queue,
+        up to the batch size
+        """
+        torrents = [torrent]
+        while len(torrents) < self.batch_size:
+            try:
+                torrent = self.torrent_queue.get_nowait()
+            except Empty:
+                break
+            if torrent is None:
+                # Sentinel object belongs to another worker, so put it back
+                self.torrent_queue.put(None)
+                break
+            torrents.append(torrent)
+        return torrents
+
+    def _list_torrent(self, torrent):
         # Get torrent package files from server
         try:
             package_files = self.requests_manager.get_json(
@@ -58,25 +86,55 @@ class PackagedTorrentLister(DaSDWorker):
             torrent.set_error(exc)
             return
 
-        # Insert package files into database
-        for package_file in package_files:
-            try:
-                PackageFile.objects.create(
-                    filename=package_file['filename'],
-                    filesize=package_file['filesize'],
-                    sha256=package_file['sha256'],
-                    torrent=torrent,
-                    stage=self.package_file_completed_stage()
-                )
-            except Exception as exc:
-                # Set error on torrent and delete all package files
-                log.exception('Failed to create package file: %s', package_file['filename'])
+        self._add_package_files(torrent, package_files)
+
+    def _list_torrents(self, torrents):
+        # Get package files of all torrents from server in one request
+        try:
+            package_files = self.requests_manager.post_json(
+                self.package_files_url,
+                json={
+                    'torrents': [torrent.name for torrent in torrents]
+                }
+            )
+        except DaSDRequestError as exc:
+            log.exception('Failed to get package files for %d torrents', len(torrents))
+            for torrent in torrents:
                 torrent.set_error(exc)
-                PackageFile.objects.filter(torrent=torrent).delete()
-                return
-
-        # Update torrent with count of package files and
-        # move to completed stage
-        torrent.package_files_count = len(package_files)
-        torrent.stage = self.completed_stage()
-        torrent.save()
+            return
+
+        for torrent in torrents:
+            torrent_package_files = package_files.get(torrent.name)
+            if torrent_package_files is None:
+                # Torrent is not packaged yet
+                log.error('Torrent not packaged yet: %s', torrent.name)
+                torrent.set_error(DaSDRequestError('Torrent not packaged yet: %s' % torrent.name))
+                continue
+
+            self._add_package_files(torrent, torrent_package_files)
+
+    def _add_package_files(self, torrent, package_files):
+        # Insert package files and update torrent with count of package
+        # files and move to completed stage, all or nothing
+        try:
+            with transaction.atomic():
+                PackageFile.objects.bulk_create([
+                    PackageFile(
+                        filename=package_file['filename'],
+                        filesize=package_file['filesize'],
+                        sha256=package_file['sha256'],
+                        torrent=torrent,
+                        stage=self.package_file_completed_stage()
+                    )
+                    for package_file in package_files
+                ])
+                torrent.package_files_count = len(package_files)
+                torrent.stage = self.completed_stage()
+                torrent.save()
+        except Exception as exc:
+            # Set error on torrent, no package files were created
+            log.exception('Failed to create package files: %s', torrent.name)
+            torrent.refresh_from_db()
+            torrent.set_error(PackagedTorrentListerError(
+                'Failed to create package files: %s: %s' % (torrent.name, exc)
+            ))
@@ -1,4 +1,6 @@
 """Packaged Torrent Monitor"""
+import requests
+
 from dasdaemon.exceptions import (
     GetCompletedTorrentsError,
     DaSDRequestError
@@ -17,18 +19,44 @@ class PackagedTorrentMonitor(DaSDWorker):
 
         # Parse config
         self.packaged_torrents_url = self.worker_config['packaged_torrents_url']
+        self.incremental = self.worker_config.get('incremental', 'false').lower() == 'true'
+
+        # Long poll for packaged torrents instead of sleeping between polls
+        self.long_poll = self.worker_config.get('long_poll', 'false').lower() == 'true'
+        self.long_poll_url = self.worker_config.get('long_poll_url', self.packaged_torrents_url + 'wait/')
+        self.long_poll_timeout_sec = int(self.worker_config.get('long_poll_timeout_sec', 20))
+        self.error_sleep = self._sleep
+        if self.long_poll:
+            self.incremental = True
+            self._sleep = 0
+
+        # Long poll waits on its own session, so it does not keep a pooled
+        # session checked out
+        self.long_poll_session = None
 
         # List of packaged torrents
         self.packaged_torrents = set()
 
+        # Cursor and ETag of the last incremental listing
+        self.cursor = ''
+        self.etag = None
+
     def do_prepare(self):
         """Find packaged torrents already in database
         and add them to list
         """
+        if self.incremental:
+            # New torrents are checked against the database instead
+            return
+
         for torrent in Torrent.objects.filter(stage=self.completed_stage()):
             self.packaged_torrents.add(torrent.name)
             log.info('Added: %s', torrent.name)
 
+    def do_stop(self):
+        if self.long_poll_session is not None:
+            self.long_poll_session.close()
+
     def do_work(self):
         """Find new packaged torrents on server and add
         them to database
@@ -45,7 +73,69 @@ class PackagedTorrentMonitor(DaSDWorker):
         json = self.requests_manager.get_json(self.packaged_torrents_url)
         return set(json)
 
+    def _get_changed_torrents(self):
+        """Get list of torrents packaged since the last request from server.
+        Update the cursor and ETag for the next request.
+        """
+        if self.long_poll:
+            # Wait on server until torrents are packaged or timeout
+            if self.long_poll_session is None:
+                self.long_poll_session = self.requests_manager.create_session()
+            req = self.requests_manager.get(
+                self.long_poll_url,
+                params={'since': self.cursor, 'timeout': self.long_poll_timeout_sec},
+                timeout=self.long_poll_timeout_sec + (self.requests_manager.timeout or 0),
+                session=self.long_poll_session
+            )
+        else:
+            headers = {}
+            if self.etag is not None:
+                headers['If-None-Match'] = self.etag
+
+            req = self.requests_manager.get(
+                self.packaged_torrents_url,
+                params={'since': self.cursor},
+                headers=headers
+            )
+        if req is None:
+            raise DaSDRequestError('Request is None')
+        elif req.status_code == requests.codes.not_modified:
+            return []
+        elif req.status_code != requests.codes.ok:
+            raise DaSDRequestError('Request returned %d' % req.status_code)
+
+        try:
+            json = req.json()
+            torrents = json['torrents']
+            self.cursor = json['cursor']
+        except (ValueError, KeyError):
+            raise DaSDRequestError('Malformed data')
+        self.etag = req.headers.get('ETag')
+        return torrents
+
+    def _get_new_torrents_incremental(self):
+        try:
+            # Get torrents packaged since last request
+            changed_torrents = set(self._get_changed_torrents())
+        except DaSDRequestError:
+            # Request failed for some reason
+            log.exception('Failed to get packaged torrents')
+            if self.long_poll:
+                # Do not retry in a tight loop
+                self._stop_signal.wait(self.error_sleep)
+            return set()
+
+        # Torrents can be listed again, so only return the ones that are
+        # not in the database yet
+        existing_torrents = Torrent.objects\
+            .filter(name__in=changed_torrents)\
+            .values_list('name', flat=True)
+        return changed_torrents - set(existing_torrents)
+
     def _get_new_torrents(self):
+        if self.incremental:
+            return self._get_new_torrents_incremental()
+
         try:
             # Get set of packaged torrents
             packaged_torrents = self._get_packaged_torrents()
@@ -1,14 +1,84 @@
 """Find torrents and package files that are queued for deletion and delete
 them from the remote server
 """
+from django.utils import timezone
+
+from dasdaemon.exceptions import DaSDRequestError
 from dasdaemon.logger import log
-from dasdaemon.workers import DaSDWorker
+from dasdaemon.workers import DaSDWorker, DaSDPeriodicQueryFunction
 from dasdapi.models import PackageFile, Torrent
+from dasdapi.stages import TorrentStage
+
+
+class TorrentDeleterPeriodicQueryFunction(DaSDPeriodicQueryFunction):
 
+    def do_query(self):
+        """Move extracted torrents to the ready stage, so their package
+        files are deleted from the remote server. Sorting is not
+        implemented yet, so extracted torrents skip it.
+        """
+        Torrent.objects\
+            .filter(stage=TorrentStage('Sorting').previous().name)\
+            .update(stage=TorrentDeleter.ready_stage(), last_modified=timezone.now())
 
-class TorrentDeleter(object):
+
+class TorrentDeleter(DaSDWorker):
 
     torrent_stage_name = 'Deleting'
+    is_package_file_consumer = False
+    package_file_stage_name = 'Deleting'
+
+    def __init__(self, *args, **kwargs):
+        super(TorrentDeleter, self).__init__(*args, **kwargs)
+
+        # Parse config
+        self.delete_url = self.worker_config['delete_url']
+        self.batch_size = int(self.worker_config.get('batch_size', 100))
 
     def do_work(self):
-        pass
+        # Get torrent from queue
+        torrent = self.torrent_queue.get()
+        if torrent is None:
+            # Sentinel object, so quit
+            log.debug('Torrent is None')
+            return
+
+        package_files = PackageFile.objects\
+            .filter(torrent=torrent)\
+            .exclude(stage=self.package_file_completed_stage())\
+            .order_by('filename')
+        filenames = list(package_files.values_list('filename', flat=True))
+
+        for i in xrange(0, len(filenames), self.batch_size):
+            batch = filenames[i:i + self.batch_size]
+            try:
+                self._delete_remote_package_files(batch)
+            except DaSDRequestError as exc:
+                # Deleted package files stay deleted, retry the rest later
+                log.exception('Failed to delete package files: %s', torrent.name)
+                torrent.set_error(exc)
+                return
+
+            PackageFile.objects\
+                .filter(torrent=torrent, filename__in=batch)\
+                .update(stage=self.package_file_completed_stage())
+
+        log.info('Deleted %d package files: %s', len(filenames), torrent.name)
+        torrent.stage = self.completed_stage()
+        torrent.save()
+
+    def _delete_remote_package_files(self, filenames):
+        """Delete package files from remote server in one request. Package
+        files that are already missing count as deleted.
+        """
+        result = self.requests_manager.delete_json(
+            self.delete_url,
+            json={
+                'filenames': filenames
+            }
+        )
+        try:
+            if result['missing']:
+                log.warning('Package files already deleted: %s', ', '.join(result['missing']))
+        except (KeyError, TypeError):
+            raise DaSDRequestError('Malformed data')
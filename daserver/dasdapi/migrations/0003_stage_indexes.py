@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-17 16:26
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dasdapi', '0002_auto_20180205_0123'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='packagefile',
+            name='stage',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='packagefileerror',
+            name='message',
+            field=models.CharField(max_length=1024),
+        ),
+        migrations.AlterField(
+            model_name='packagefileerror',
+            name='type',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='torrent',
+            name='stage',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='torrenterror',
+            name='message',
+            field=models.CharField(max_length=1024),
+        ),
+        migrations.AlterField(
+            model_name='torrenterror',
+            name='type',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterIndexTogether(
+            name='packagefile',
+            index_together=set([('torrent', 'stage'), ('torrent', 'filename')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='packagefileerror',
+            index_together=set([('package_file', 'time')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='torrenterror',
+            index_together=set([('torrent', 'time')]),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-17 16:27
+from __future__ import unicode_literals
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+from dasdapi.stages import PackageFileStage, StageDoesNotExist, TorrentStage
+
+
+def schedule_existing_errors(apps, schema_editor):
+    """Set retry stage and time for objects already in error stage from
+    their most recent error
+    """
+    for model_name, stage_class in [('Torrent', TorrentStage), ('PackageFile', PackageFileStage)]:
+        model = apps.get_model('dasdapi', model_name)
+        for obj in model.objects.filter(stage='Error'):
+            error = obj.errors.order_by('-time').first()
+            if error is None:
+                continue
+            try:
+                obj.retry_stage = stage_class(error.stage).previous_completed().name
+            except StageDoesNotExist:
+                continue
+            obj.next_retry_at = error.time + timedelta(seconds=error.retry_delay)
+            obj.save(update_fields=['retry_stage', 'next_retry_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dasdapi', '0003_stage_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='packagefile',
+            name='next_retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='packagefile',
+            name='retry_stage',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='torrent',
+            name='next_retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='torrent',
+            name='retry_stage',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='packagefile',
+            index_together=set([('torrent', 'stage'), ('stage', 'next_retry_at'), ('torrent', 'filename')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='torrent',
+            index_together=set([('stage', 'next_retry_at')]),
+        ),
+        migrations.RunPython(schedule_existing_errors, migrations.RunPython.noop),
+    ]
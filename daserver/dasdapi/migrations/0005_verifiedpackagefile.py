@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-17 18:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dasdapi', '0004_error_retry_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VerifiedPackageFile',
+            fields=[
+                ('package_file', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='verified', serialize=False, to='dasdapi.PackageFile')),
+                ('dev', models.BigIntegerField()),
+                ('inode', models.BigIntegerField()),
+                ('size', models.BigIntegerField()),
+                ('mtime_ns', models.BigIntegerField()),
+                ('sha256', models.CharField(max_length=255)),
+            ],
+        ),
+    ]
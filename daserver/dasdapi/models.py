@@ -1,20 +1,53 @@
 from __future__ import unicode_literals
 
+from datetime import timedelta
+import random
+
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
-from dasdapi.stages import TorrentStage
+from dasdapi.stages import PackageFileStage, StageDoesNotExist, TorrentStage
+
+
+def get_retry_delay(count):
+    """Return retry delay in seconds after an error occurred `count` times.
+    The delay doubles with each error up to a maximum, plus random jitter
+    as a fraction of the delay.
+    """
+    config = getattr(settings, 'DASDAPI', {})
+    base_delay = config.get('RETRY_DELAY_SEC', 2)
+    max_delay = config.get('RETRY_MAX_DELAY_SEC', 3600)
+    jitter = config.get('RETRY_JITTER', 0.1)
+
+    delay = min(max_delay, base_delay * 2 ** (count - 1))
+    return int(round(delay + random.uniform(0, delay * jitter)))
+
+
+def get_retry_stage(stage_class, stage):
+    """Return stage to move back to when retrying an error that occurred
+    at `stage`, or None if there is no previous completed stage
+    """
+    try:
+        return stage_class(stage).previous_completed().name
+    except StageDoesNotExist:
+        return None
 
 
 class Torrent(models.Model):
     name = models.CharField(max_length=255)
     created = models.DateTimeField(auto_now_add=True)
     last_modified = models.DateTimeField(auto_now_add=True)
-    stage = models.CharField(max_length=255)
+    stage = models.CharField(max_length=255, db_index=True)
     package_files_count = models.IntegerField(default=0)
+    retry_stage = models.CharField(max_length=255, blank=True, null=True)
+    next_retry_at = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         ordering = ('created',)
+        index_together = (
+            ('stage', 'next_retry_at'),
+        )
 
     def __unicode__(self):
         return 'Torrent: id: %d, created: %s, stage: %s, package_files_count: %d' % (
@@ -35,7 +68,7 @@ class Torrent(models.Model):
 
     def set_error(self, error):
         """Create error if necessary, otherwise update the most recent error.
-        Then, move torrent to error stage.
+        Then, schedule the retry and move torrent to error stage.
         """
         err, created = self.errors.get_or_create(
             type=error.id,
@@ -47,6 +80,8 @@ class Torrent(models.Model):
 
         if not created:
             err.save()
+        self.retry_stage = get_retry_stage(TorrentStage, err.stage)
+        self.next_retry_at = err.next_retry_at() if self.retry_stage else None
         self.stage = 'Error'
         self.save()
 
@@ -56,11 +91,20 @@ class PackageFile(models.Model):
     torrent = models.ForeignKey(Torrent, related_name='package_file_set')
     filesize = models.IntegerField(default=0)
     sha256 = models.CharField(max_length=255, blank=True)
-    stage = models.CharField(max_length=255)
+    stage = models.CharField(max_length=255, db_index=True)
+    retry_stage = models.CharField(max_length=255, blank=True, null=True)
+    next_retry_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        index_together = (
+            ('torrent', 'stage'),
+            ('torrent', 'filename'),
+            ('stage', 'next_retry_at'),
+        )
 
     def set_error(self, error):
         """Create error if necessary, otherwise update the most recent error.
-        Then, move torrent to error stage.
+        Then, schedule the retry and move package file to error stage.
         """
         err, created = self.errors.get_or_create(
             type=error.id,
@@ -72,6 +116,8 @@ class PackageFile(models.Model):
 
         if not created:
             err.save()
+        self.retry_stage = get_retry_stage(PackageFileStage, err.stage)
+        self.next_retry_at = err.next_retry_at() if self.retry_stage else None
         self.stage = 'Error'
         self.save()
 
@@ -87,6 +133,9 @@ class TorrentError(models.Model):
 
     class Meta:
         ordering = ('-time',)
+        index_together = (
+            ('torrent', 'time'),
+        )
 
     def save(self, *args, **kwargs):
         """Update time, increment count, increase retry delay exponentially,
@@ -94,9 +143,13 @@ class TorrentError(models.Model):
         """
         self.time = timezone.now()
         self.count += 1
-        self.retry_delay **= 2
+        self.retry_delay = get_retry_delay(self.count)
         super(TorrentError, self).save(*args, **kwargs)
 
+    def next_retry_at(self):
+        """Return time when the retry delay has passed"""
+        return self.time + timedelta(seconds=self.retry_delay)
+
 
 class PackageFileError(models.Model):
     package_file = models.ForeignKey(PackageFile, related_name='errors')
@@ -109,6 +162,9 @@ class PackageFileError(models.Model):
 
     class Meta:
         ordering = ('-time',)
+        index_together = (
+            ('package_file', 'time'),
+        )
 
     def save(self, *args, **kwargs):
         """Update time, increment count, increase retry delay exponentially,
@@ -116,5 +172,26 @@ class PackageFileError(models.Model):
         """
         self.time = timezone.now()
         self.count += 1
-        self.retry_delay **= 2
+        self.retry_delay = get_retry_delay(self.count)
         super(PackageFileError, self).save(*args, **kwargs)
+
+    def next_retry_at(self):
+        """Return time when the retry delay has passed"""
+        return self.time + timedelta(seconds=self.retry_delay)
+
+
+class VerifiedPackageFile(models.Model):
+    """SHA256 of a package file on disk that passed verification, stored
+    with the identity of the file. An unchanged file does not need to be
+    hashed again, such as after a restart.
+    """
+    package_file = models.OneToOneField(PackageFile, primary_key=True, related_name='verified')
+    dev = models.BigIntegerField()
+    inode = models.BigIntegerField()
+    size = models.BigIntegerField()
+    mtime_ns = models.BigIntegerField()
+    sha256 = models.CharField(max_length=255)
+
+    def get_file_id(self):
+        """Return file identity in the format of utils.fs.get_file_id"""
+        return self.dev, self.inode, self.size, self.mtime_ns
@@ -109,3 +109,14 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/1.8/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Error retry delay
+# Doubles with each error up to the maximum, plus random jitter as a
+# fraction of the delay
+
+DASDAPI = {
+    'RETRY_DELAY_SEC': 2,
+    'RETRY_MAX_DELAY_SEC': 3600,
+    'RETRY_JITTER': 0.1,
+}
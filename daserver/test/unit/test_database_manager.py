@@ -1,3 +1,7 @@
+import threading
+
+from mock import patch
+
 from dasdaemon.managers import DatabaseManager
 from dasdapi.models import Torrent
 
@@ -13,12 +17,14 @@ class DatabaseManagerUnitTests(DaServerUnitTest):
         # Query call counters
         self._one_time_count = 0
         self._periodic_count = 0
+        self._periodic_called = threading.Event()
 
     def _one_time_function(self):
         self._one_time_count += 1
 
     def _periodic_function(self):
         self._periodic_count += 1
+        self._periodic_called.set()
 
 
     def test_run_one_time_function(self):
@@ -65,3 +71,34 @@ class DatabaseManagerUnitTests(DaServerUnitTest):
 
             # Verify function is run every time
             self.assertEqual(self._periodic_count, count)
+
+    def test_run_notify(self):
+        # Register periodic function and poll rarely
+        self.db.poll_interval_sec = 60
+        self.db.register_periodic_function(self._periodic_function)
+
+        # Start database manager and wait for first round
+        self.db.start()
+        self.assertTrue(self._periodic_called.wait(5))
+        self._periodic_called.clear()
+
+        # Notify database manager and verify it runs again before polling
+        self.db.notify()
+        self.assertTrue(self._periodic_called.wait(5))
+
+        # Stop database manager
+        self.db.stop()
+        self.db.join(5)
+        self.assertFalse(self.db.is_alive())
+        self.assertEqual(self._periodic_count, 2)
+
+    def test_on_model_saved(self):
+        # Verify save from another thread wakes database manager
+        self.db._on_model_saved(sender=Torrent)
+        self.assertTrue(self.db.wake_signal.is_set())
+
+    def test_on_model_saved_by_database_manager(self):
+        # Verify save from database manager thread does not wake it
+        with patch('threading.current_thread', return_value=self.db):
+            self.db._on_model_saved(sender=Torrent)
+        self.assertFalse(self.db.wake_signal.is_set())
@@ -1,5 +1,7 @@
+from datetime import timedelta
 import time
 
+from django.test import override_settings
 from mock import patch
 
 from dasdaemon.exceptions import DaSDError
@@ -22,6 +24,11 @@ class DaSDTestError2(DaSDError):
     'P2', 'C2',
     'P3', 'C3'
 ])
+@override_settings(DASDAPI={
+    'RETRY_DELAY_SEC': 2,
+    'RETRY_MAX_DELAY_SEC': 8,
+    'RETRY_JITTER': 0,
+})
 class ErrorHandlerUnitTests(DaServerUnitTest):
 
     def setUp(self):
@@ -45,7 +52,7 @@ class ErrorHandlerUnitTests(DaServerUnitTest):
         self.assertEqual(error.message, torrent_error.message)
         self.assertEqual('P2', torrent_error.stage)
         self.assertEqual(1, torrent_error.count)
-        self.assertEqual(2 ** 2, torrent_error.retry_delay)
+        self.assertEqual(2, torrent_error.retry_delay)
 
     def test_set_error_twice(self):
         # Set error on Torrent twice
@@ -62,7 +69,7 @@ class ErrorHandlerUnitTests(DaServerUnitTest):
         self.assertEqual(error.message, torrent_error.message)
         self.assertEqual('P2', torrent_error.stage)
         self.assertEqual(2, torrent_error.count)
-        self.assertEqual(2 ** 2 ** 2, torrent_error.retry_delay)
+        self.assertEqual(4, torrent_error.retry_delay)
 
     def test_set_error_two_types_once(self):
         # Set first error on Torrent
@@ -86,7 +93,7 @@ class ErrorHandlerUnitTests(DaServerUnitTest):
         self.assertEqual(error1.message, torrent_error1.message)
         self.assertEqual('P2', torrent_error1.stage)
         self.assertEqual(1, torrent_error1.count)
-        self.assertEqual(2 ** 2, torrent_error1.retry_delay)
+        self.assertEqual(2, torrent_error1.retry_delay)
 
         # Verify error2 fields
         torrent_error2 = self.torrent.errors.all()[0]
@@ -94,7 +101,44 @@ class ErrorHandlerUnitTests(DaServerUnitTest):
         self.assertEqual(error2.message, torrent_error2.message)
         self.assertEqual('P3', torrent_error2.stage)
         self.assertEqual(1, torrent_error2.count)
-        self.assertEqual(2 ** 2, torrent_error2.retry_delay)
+        self.assertEqual(2, torrent_error2.retry_delay)
+
+    def test_set_error_max_delay(self):
+        # Set error on Torrent until the delay reaches the maximum
+        error = DaSDTestError1('Test Error 1')
+        for _ in range(5):
+            self.torrent.set_error(error)
+
+        # Verify delay is capped
+        torrent_error = self.torrent.errors.first()
+        self.assertEqual(5, torrent_error.count)
+        self.assertEqual(8, torrent_error.retry_delay)
+
+    def test_set_error_next_retry_at(self):
+        # Set error on Torrent
+        error = DaSDTestError1('Test Error 1')
+        self.torrent.set_error(error)
+
+        # Verify retry is scheduled from the most recent error
+        self.torrent.refresh_from_db()
+        torrent_error = self.torrent.errors.first()
+        self.assertEqual('C1', self.torrent.retry_stage)
+        self.assertEqual(
+            torrent_error.time + timedelta(seconds=torrent_error.retry_delay),
+            self.torrent.next_retry_at
+        )
+
+    def test_ErrorHandlerPeriodicQueryFunction_not_due(self):
+        # Set error on Torrent
+        error1 = DaSDTestError1('Test Error 1')
+        self.torrent.set_error(error1)
+
+        # Run periodic query function before the retry delay passes
+        ErrorHandlerPeriodicQueryFunction().do_query()
+
+        # Verify torrent is still in error stage
+        self.torrent.refresh_from_db()
+        self.assertEqual('Error', self.torrent.stage)
 
     def test_ErrorHandlerPeriodicQueryFunction(self):
         # Set error on Torrent
@@ -113,3 +157,4 @@ class ErrorHandlerUnitTests(DaServerUnitTest):
         # Verify torrent stage
         self.torrent.refresh_from_db()
         self.assertEqual('C1', self.torrent.stage)
+        self.assertIsNone(self.torrent.next_retry_at)
@@ -1,17 +1,23 @@
 import os
+import re
 
+from mock import patch
+import responses
+
+from dasdaemon.exceptions import PackageDownloadError
 from dasdaemon.managers import (
     PathManager,
     QueueManager,
     RequestsManager
 )
+from dasdaemon.managers.queue_manager import ConsumerQueue
 import dasdaemon.utils as utils
 from dasdaemon.workers import (
     PackageDownloader,
     PackageDownloaderOneTimeQueryFunction,
     PackageDownloaderPeriodicQueryFunction
 )
-from dasdapi.models import Torrent, PackageFile
+from dasdapi.models import Torrent, PackageFile, VerifiedPackageFile
 
 import test.common as common
 from test.unit import DaServerUnitTest
@@ -66,6 +72,285 @@ class PackageDownloaderUnitTests(DaServerUnitTest):
 
         return torrent, package_files
 
+    def _mock_download(self, package_file, data, fail_ranges=()):
+        """Mock token request and ranged download of package file data"""
+        common.mock_requests_manager()
+
+        def _callback(request):
+            match = re.match(r'bytes=(\d+)-(\d*)', request.headers['Range'])
+            start = int(match.group(1))
+            stop = int(match.group(2)) if match.group(2) else len(data) - 1
+            if (start, stop) in fail_ranges:
+                return (500, {}, '')
+            return (206, {}, data[start:stop+1])
+
+        responses.add_callback(
+            responses.GET,
+            self.pd._get_request_url(package_file),
+            callback=_callback
+        )
+
+    def _create_package_file(self, data):
+        torrent = Torrent.objects.create(name='Torrent')
+        package_file = PackageFile.objects.create(
+            filename='%s.0000' % torrent.name,
+            filesize=len(data),
+            sha256=utils.hash.sha256_bytes(data),
+            torrent=torrent,
+            stage=PackageDownloader.package_file_processing_stage()
+        )
+        return torrent, package_file
+
+    def test_get_segments(self):
+        self.pd.segments = 4
+
+        # Verify segments cover file without overlapping
+        segments = self.pd._get_segments(10)
+        self.assertEqual(
+            [(0, 2), (3, 5), (6, 8), (9, 9)],
+            [(segment['start'], segment['stop']) for segment in segments]
+        )
+        for segment in segments:
+            self.assertEqual(segment['start'], segment['offset'])
+
+        # Verify fewer segments than bytes
+        segments = self.pd._get_segments(2)
+        self.assertEqual(
+            [(0, 0), (1, 1)],
+            [(segment['start'], segment['stop']) for segment in segments]
+        )
+
+    @responses.activate
+    def test_download_package_file_segmented(self):
+        self.pd.segments = 4
+        self.pd.segment_min_bytes = 1
+
+        # Create package file and mock download
+        data = os.urandom(12345)
+        torrent, package_file = self._create_package_file(data)
+        self._mock_download(package_file, data)
+
+        # Download package file
+        self.pd._download_package_file(package_file)
+
+        # Verify one request per segment
+        ranges = sorted(call.request.headers['Range'] for call in responses.calls[1:])
+        self.assertEqual(
+            ['bytes=0-3086', 'bytes=3087-6173', 'bytes=6174-9260', 'bytes=9261-12344'],
+            ranges
+        )
+
+        # Verify package file contents and stage
+        path = self.pm.get_package_file_path(torrent, package_file)
+        with open(path, 'rb') as in_file:
+            self.assertEqual(data, in_file.read())
+        self.assertFalse(os.path.isfile(self.pd._get_segments_path(torrent, package_file)))
+        self.assertEqual(PackageDownloader.package_file_completed_stage(), package_file.stage)
+
+    @responses.activate
+    def test_download_package_file_segmented_resume(self):
+        self.pd.segments = 4
+        self.pd.segment_min_bytes = 1
+
+        # Create package file and mock download with one failing segment
+        data = os.urandom(12345)
+        torrent, package_file = self._create_package_file(data)
+        self._mock_download(package_file, data, fail_ranges=[(3087, 6173)])
+
+        # Verify download fails and progress is saved
+        with self.assertRaises(PackageDownloadError):
+            self.pd._download_package_file(package_file)
+        segments_path = self.pd._get_segments_path(torrent, package_file)
+        self.assertTrue(os.path.isfile(segments_path))
+
+        # Resume download without failures
+        responses.reset()
+        self._mock_download(package_file, data)
+        self.pd._download_package_file(package_file)
+
+        # Verify only the missing segment was requested
+        ranges = [
+            call.request.headers['Range'] for call in responses.calls
+            if 'Range' in call.request.headers
+        ]
+        self.assertEqual(['bytes=3087-6173'], ranges)
+
+        # Verify package file contents
+        path = self.pm.get_package_file_path(torrent, package_file)
+        with open(path, 'rb') as in_file:
+            self.assertEqual(data, in_file.read())
+        self.assertFalse(os.path.isfile(segments_path))
+
+    @responses.activate
+    def test_download_package_file_segmented_progress(self):
+        self.pd.segments = 2
+        self.pd.segment_min_bytes = 1
+        self.pd.segment_progress_bytes = 4096
+
+        # Create package file and mock download
+        data = os.urandom(12345)
+        torrent, package_file = self._create_package_file(data)
+        self._mock_download(package_file, data)
+
+        # Record saved segment offsets while downloading
+        saved_offsets = []
+        save_segments = self.pd._save_segments
+        def _save_segments(segments_path, segments):
+            saved_offsets.append([segment['offset'] for segment in segments])
+            save_segments(segments_path, segments)
+
+        with patch.object(self.pd, '_save_segments', side_effect=_save_segments):
+            self.pd._download_package_file(package_file)
+
+        # Verify progress was saved before the segments finished
+        self.assertIn([0, 6173], saved_offsets)
+        self.assertTrue(any(
+            0 < offsets[0] < 6173 or 6173 < offsets[1] < 12345
+            for offsets in saved_offsets
+        ))
+        self.assertIn([6173, 12345], saved_offsets)
+
+    @responses.activate
+    def test_download_package_file_hashed_while_writing(self):
+        # Create package file and mock download
+        data = os.urandom(12345)
+        torrent, package_file = self._create_package_file(data)
+        self._mock_download(package_file, data)
+
+        # Download package file without reading it back
+        with patch.object(utils.hash, 'sha256_file') as mock_function:
+            self.pd._download_package_file(package_file)
+        mock_function.assert_not_called()
+
+        # Verify package file stage
+        self.assertEqual(PackageDownloader.package_file_completed_stage(), package_file.stage)
+
+    @responses.activate
+    def test_download_package_file_hashed_while_resuming(self):
+        # Create package file with partial data on disk and mock download
+        data = os.urandom(12345)
+        torrent, package_file = self._create_package_file(data)
+        self._mock_download(package_file, data)
+        self.pm.create_package_files_dir(torrent)
+        path = self.pm.get_package_file_path(torrent, package_file)
+        with open(path, 'wb') as out_file:
+            out_file.write(data[:1000])
+
+        # Resume download
+        self.pd._download_package_file(package_file)
+
+        # Verify only missing bytes were requested
+        self.assertEqual('bytes=1000-', responses.calls[-1].request.headers['Range'])
+
+        # Verify package file contents and stage
+        with open(path, 'rb') as in_file:
+            self.assertEqual(data, in_file.read())
+        self.assertEqual(PackageDownloader.package_file_completed_stage(), package_file.stage)
+
+    def test_do_work_verify_batch(self):
+        # Create package files that are complete on disk, one corrupted
+        torrent = Torrent.objects.create(name='Torrent')
+        self.pm.create_package_files_dir(torrent)
+        package_files = []
+        for i in xrange(4):
+            data = os.urandom(12345)
+            package_file = PackageFile.objects.create(
+                filename='%s.%04d' % (torrent.name, i),
+                filesize=len(data),
+                sha256=utils.hash.sha256_bytes(data),
+                torrent=torrent,
+                stage=PackageDownloader.package_file_ready_stage()
+            )
+            with open(self.pm.get_package_file_path(torrent, package_file), 'wb') as out_file:
+                out_file.write(data if i != 3 else os.urandom(len(data)))
+            package_files.append(package_file)
+
+        # Register as consumer and run queue manager
+        self.pd.verify_batch_size = 4
+        self.pd.register_as_consumer()
+        self.qm._execute_queries()
+
+        # Verify all package files in one batch without downloading them
+        self.pd.do_work()
+        self.assertTrue(self.pd.package_file_queue.empty())
+
+        for package_file in package_files[:3]:
+            package_file.refresh_from_db()
+            self.assertEqual(PackageDownloader.package_file_completed_stage(), package_file.stage)
+
+        # Verify corrupted package file was removed
+        package_files[3].refresh_from_db()
+        self.assertEqual('Error', package_files[3].stage)
+        self.assertFalse(os.path.isfile(self.pm.get_package_file_path(torrent, package_files[3])))
+
+    def test_do_work_verify_batch_keeps_order(self):
+        # Create package files, only some of them complete on disk
+        torrent = Torrent.objects.create(name='Torrent')
+        self.pm.create_package_files_dir(torrent)
+        self.pd.package_file_queue = ConsumerQueue()
+        package_files = []
+        for i, complete in enumerate([True, True, False, True, False]):
+            data = os.urandom(12345)
+            package_file = PackageFile.objects.create(
+                filename='%s.%04d' % (torrent.name, i),
+                filesize=len(data),
+                sha256=utils.hash.sha256_bytes(data),
+                torrent=torrent,
+                stage=PackageDownloader.package_file_ready_stage()
+            )
+            if complete:
+                with open(self.pm.get_package_file_path(torrent, package_file), 'wb') as out_file:
+                    out_file.write(data)
+            self.pd.package_file_queue.put(package_file)
+            package_files.append(package_file)
+
+        # Verify only complete package files at the head of queue are batched
+        self.pd.verify_batch_size = 4
+        self.pd.do_work()
+        for package_file in package_files[:2]:
+            package_file.refresh_from_db()
+            self.assertEqual(PackageDownloader.package_file_completed_stage(), package_file.stage)
+
+        # Verify remaining package files keep their download order
+        self.assertEqual(
+            [pf.filename for pf in package_files[2:]],
+            [pf.filename for pf in self.pd.package_file_queue.queue]
+        )
+
+        # Verify incomplete package file is downloaded before the others
+        with patch.object(self.pd, '_download_package_file') as download_package_file:
+            self.pd.do_work()
+        download_package_file.assert_called_once_with(package_files[2])
+        self.assertEqual(
+            [pf.filename for pf in package_files[3:]],
+            [pf.filename for pf in self.pd.package_file_queue.queue]
+        )
+
+    def test_verify_package_file_cached(self):
+        # Create package file that is complete on disk
+        data = os.urandom(12345)
+        torrent, package_file = self._create_package_file(data)
+        self.pm.create_package_files_dir(torrent)
+        path = self.pm.get_package_file_path(torrent, package_file)
+        with open(path, 'wb') as out_file:
+            out_file.write(data)
+
+        # Verify package file by hashing it
+        self.assertTrue(self.pd._verify_package_file(torrent, package_file))
+        self.assertTrue(VerifiedPackageFile.objects.filter(package_file=package_file).exists())
+
+        # Verify unchanged package file without hashing it again
+        with patch.object(utils.hash, 'sha256_file') as mock_function:
+            self.assertTrue(self.pd._verify_package_file(torrent, package_file))
+        mock_function.assert_not_called()
+
+        # Verify changed package file is hashed again
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+        with patch.object(utils.hash, 'sha256_file', return_value=package_file.sha256) as mock_function:
+            self.assertTrue(self.pd._verify_package_file(torrent, package_file))
+        mock_function.assert_called_once_with(path, utils.hash.DEFAULT_BLOCK_SIZE)
+
     def test_do_one_time_query_function(self):
         # Create Torrent
         torrent = Torrent.objects.create(name='Torrent')
@@ -117,6 +402,44 @@ class PackageDownloaderUnitTests(DaServerUnitTest):
         t = Torrent.objects.get(pk=1)
         self.assertEqual(t.stage, PackageDownloader.processing_stage())
 
+    def test_do_periodic_query_function_completed(self):
+        # Create Torrents at processing stage
+        torrent1 = Torrent.objects.create(
+            name='Torrent1',
+            stage=PackageDownloader.processing_stage(),
+            package_files_count=2
+        )
+        torrent2 = Torrent.objects.create(
+            name='Torrent2',
+            stage=PackageDownloader.processing_stage(),
+            package_files_count=2
+        )
+
+        # Add completed Package Files for Torrent1 and one completed
+        # Package File for Torrent2
+        for torrent, stages in [
+            (torrent1, [PackageDownloader.package_file_completed_stage()] * 2),
+            (torrent2, [
+                PackageDownloader.package_file_completed_stage(),
+                PackageDownloader.package_file_processing_stage()
+            ])
+        ]:
+            for i, stage in enumerate(stages):
+                PackageFile.objects.create(
+                    filename='%s.%04d' % (torrent.name, i),
+                    torrent=torrent,
+                    stage=stage
+                )
+
+        # Run periodic query function
+        PackageDownloaderPeriodicQueryFunction().do_query()
+
+        # Verify only Torrent1 moved to completed stage
+        torrent1.refresh_from_db()
+        torrent2.refresh_from_db()
+        self.assertEqual(torrent1.stage, PackageDownloader.completed_stage())
+        self.assertEqual(torrent2.stage, PackageDownloader.processing_stage())
+
     def test_do_work_nonexistant_file(self):
         # Add package file to database
         torrent = Torrent.objects.create(name='Torrent')
@@ -1,5 +1,16 @@
+import os
+import tempfile
+
+from mock import patch
+
+from dasdaemon.exceptions import PackageExtractorError
 from dasdaemon.managers import PathManager
-from dasdaemon.workers import PackageExtractor
+import dasdaemon.utils as utils
+from dasdaemon.workers import (
+    PackageDownloader,
+    PackageExtractor,
+    PackageExtractorPeriodicQueryFunction
+)
 from dasdapi.models import Torrent, PackageFile
 
 import test.common as common
@@ -127,3 +138,168 @@ class PackageExtractorUnitTests(DaServerUnitTest):
         self.assertEqual(package_file_names2[1], package_file_set2[2].filename)
         self.assertEqual(package_file_names2[2], package_file_set2[3].filename)
         self.assertEqual(package_file_names2[0], package_file_set2[4].filename)
+
+    def _create_package_files(self, torrent, filename, stage='Does Not Matter'):
+        """Create tarball containing random file and split it into
+        package files. Return SHA256 of random file.
+        """
+        tmpdir = tempfile.mkdtemp()
+        filepath = os.path.join(tmpdir, filename)
+        utils.fs.write_random_file(filepath, 10240)
+        sha256 = utils.hash.sha256_file(filepath)
+
+        tarpath = os.path.join(tmpdir, torrent.name + '.tar')
+        utils.arc.create_tar_file(tarpath, [filepath], basenames=True)
+
+        package_files_dir = self.pm.create_package_files_dir(torrent)
+        for package_file in utils.fs.split_file(tarpath, package_files_dir, 1024):
+            PackageFile.objects.create(
+                filename=package_file,
+                torrent=torrent,
+                stage=stage
+            )
+
+        utils.fs.rm_rf(tmpdir)
+        return sha256
+
+    def test_extract_package_stream(self):
+        # Create torrent with package files
+        torrent = Torrent.objects.create(name='StreamTorrent')
+        filename = 'file1.bin'
+        sha256 = self._create_package_files(torrent, filename)
+
+        # Extract package
+        self.pe._extract_package(torrent)
+
+        # Verify package archive was not created
+        self.assertFalse(os.path.exists(self.pm.get_package_archive_path(torrent)))
+
+        # Verify extracted file
+        extracted_file = os.path.join(self.pm.get_package_output_dir(torrent), filename)
+        self.assertEqual(sha256, utils.hash.sha256_file(extracted_file))
+
+        # Remove directories
+        utils.fs.rm_rf(self.pm.get_package_files_dir(torrent))
+        utils.fs.rm_rf(self.pm.get_package_output_dir(torrent))
+
+    def test_extract_package_pipelined(self):
+        self.pe.pipelined = True
+
+        # Create torrent with downloaded package files
+        torrent = Torrent.objects.create(name='PipelinedTorrent')
+        filename = 'file1.bin'
+        sha256 = self._create_package_files(
+            torrent, filename, stage=self.pe.package_file_ready_stage()
+        )
+
+        # Extract package
+        self.pe._extract_package(torrent)
+
+        # Verify extracted file
+        extracted_file = os.path.join(self.pm.get_package_output_dir(torrent), filename)
+        self.assertEqual(sha256, utils.hash.sha256_file(extracted_file))
+
+        # Remove directories
+        utils.fs.rm_rf(self.pm.get_package_files_dir(torrent))
+        utils.fs.rm_rf(self.pm.get_package_output_dir(torrent))
+
+    def test_extract_package_pipelined_stalled(self):
+        self.pe.pipelined = True
+        self.pe.pipeline_poll_sec = 0.01
+        self.pe.pipeline_stall_timeout_sec = 0.05
+
+        # Create torrent with package files still downloading
+        torrent = Torrent.objects.create(name='PipelinedTorrent')
+        self._create_package_files(
+            torrent, 'file1.bin', stage=PackageDownloader.package_file_processing_stage()
+        )
+
+        # Verify extraction fails when first package file makes no progress
+        with self.assertRaises(PackageExtractorError):
+            self.pe._extract_package(torrent)
+
+        # Remove directories
+        utils.fs.rm_rf(self.pm.get_package_files_dir(torrent))
+        utils.fs.rm_rf(self.pm.get_package_output_dir(torrent))
+
+    def test_extract_package_pipelined_error(self):
+        self.pe.pipelined = True
+        self.pe.pipeline_stall_timeout_sec = 3600
+
+        # Create torrent with package files still downloading
+        torrent = Torrent.objects.create(name='PipelinedTorrent')
+        self._create_package_files(
+            torrent, 'file1.bin', stage=PackageDownloader.package_file_processing_stage()
+        )
+
+        # Fail first package file while waiting for it
+        def _sleep(sec):
+            PackageFile.objects.filter(torrent=torrent).update(stage='Error')
+
+        # Verify extraction fails within one poll
+        with patch('dasdaemon.workers.package_extractor.time.sleep', side_effect=_sleep) as sleep:
+            with self.assertRaises(PackageExtractorError):
+                self.pe._extract_package(torrent)
+        self.assertEqual(1, sleep.call_count)
+
+        # Remove directories
+        utils.fs.rm_rf(self.pm.get_package_files_dir(torrent))
+        utils.fs.rm_rf(self.pm.get_package_output_dir(torrent))
+
+    def test_wait_for_package_files_progress(self):
+        self.pe.pipeline_stall_timeout_sec = 2
+
+        # Create torrent with first package file still downloading
+        torrent = Torrent.objects.create(name='PipelinedTorrent')
+        self._create_package_files(
+            torrent, 'file1.bin', stage=self.pe.package_file_ready_stage()
+        )
+        package_file_set = self.pe._get_package_file_set(torrent)
+        first_package_file = package_file_set.first()
+        first_package_file.stage = PackageDownloader.package_file_processing_stage()
+        first_package_file.save()
+        path = self.pm.get_package_file_path(torrent, first_package_file)
+
+        # Write to first package file for longer than the stall timeout,
+        # then finish downloading it
+        def _sleep(sec):
+            if sleep.call_count < 5:
+                with open(path, 'ab') as out_file:
+                    out_file.write(b'0')
+            else:
+                first_package_file.stage = self.pe.package_file_ready_stage()
+                first_package_file.save()
+
+        # Verify waiting resets the stall timeout while package file makes progress
+        with patch('dasdaemon.workers.package_extractor.time.sleep', side_effect=_sleep) as sleep:
+            package_file_paths = list(self.pe._wait_for_package_files(torrent, package_file_set))
+        self.assertEqual(5, sleep.call_count)
+        self.assertEqual(
+            [self.pm.get_package_file_path(torrent, package_file) for package_file in package_file_set],
+            package_file_paths
+        )
+
+        # Remove directories
+        utils.fs.rm_rf(self.pm.get_package_files_dir(torrent))
+
+    def test_periodic_query_function_pipelined(self):
+        # Create torrent that started downloading
+        torrent = Torrent.objects.create(
+            name='PipelinedTorrent',
+            stage=PackageDownloader.processing_stage()
+        )
+
+        # Run periodic query function without pipelined mode
+        PackageExtractorPeriodicQueryFunction(config=self.config).do_query()
+
+        # Verify torrent was not moved
+        torrent.refresh_from_db()
+        self.assertEqual(PackageDownloader.processing_stage(), torrent.stage)
+
+        # Run periodic query function in pipelined mode
+        self.config['PackageExtractor']['pipelined'] = 'true'
+        PackageExtractorPeriodicQueryFunction(config=self.config).do_query()
+
+        # Verify torrent is ready for extraction
+        torrent.refresh_from_db()
+        self.assertEqual(PackageExtractor.ready_stage(), torrent.stage)
@@ -0,0 +1,109 @@
+import json
+from Queue import Queue
+
+from django.db import DatabaseError
+from mock import patch
+import responses
+
+from dasdaemon.managers import RequestsManager
+from dasdaemon.workers import PackagedTorrentLister
+from dasdapi.models import PackageFile, Torrent
+
+import test.common as common
+from test.unit import DaServerUnitTest
+
+
+class PackagedTorrentListerUnitTests(DaServerUnitTest):
+
+    def setUp(self):
+        # Get test config with batches
+        self.config = common.load_test_config()
+        self.config['PackagedTorrentLister']['batch_size'] = '10'
+        self.url = self.config['PackagedTorrentLister']['package_files_url']
+
+        # Create instance
+        self.rm = RequestsManager(config=self.config)
+        self.ptl = PackagedTorrentLister(
+            config=self.config,
+            requests_manager=self.rm
+        )
+        self.ptl.torrent_queue = Queue()
+
+    def _create_torrents(self, count):
+        torrents = []
+        for i in xrange(count):
+            torrent = Torrent.objects.create(
+                name='Torrent%d' % i,
+                stage=PackagedTorrentLister.processing_stage()
+            )
+            self.ptl.torrent_queue.put(torrent)
+            torrents.append(torrent)
+        return torrents
+
+    def _package_files(self, torrent_name, count):
+        return [
+            {'filename': '%s.%04d' % (torrent_name, i), 'filesize': 1, 'sha256': 'a'}
+            for i in xrange(count)
+        ]
+
+    @responses.activate
+    def test_do_work_batch(self):
+        torrents = self._create_torrents(3)
+
+        # Mock batch request, last torrent is not packaged yet
+        common.mock_requests_manager()
+        responses.add(
+            responses.POST, self.url, status=200, content_type='application/json',
+            body=json.dumps({
+                'Torrent0': self._package_files('Torrent0', 2),
+                'Torrent1': self._package_files('Torrent1', 3),
+                'Torrent2': None
+            })
+        )
+
+        # List all torrents in queue at once
+        self.ptl.do_work()
+        self.assertTrue(self.ptl.torrent_queue.empty())
+        self.assertEqual(1, len([c for c in responses.calls if c.request.url == self.url]))
+
+        # Verify package files were added
+        for torrent, count in zip(torrents[:2], [2, 3]):
+            torrent.refresh_from_db()
+            self.assertEqual(PackagedTorrentLister.completed_stage(), torrent.stage)
+            self.assertEqual(count, torrent.package_files_count)
+            self.assertEqual(count, torrent.package_file_set.count())
+
+        # Verify torrent that is not packaged has error
+        torrents[2].refresh_from_db()
+        self.assertEqual('Error', torrents[2].stage)
+
+    def test_add_package_files_all_or_nothing(self):
+        torrent = self._create_torrents(1)[0]
+
+        # Fail saving torrent after package files were inserted
+        save = Torrent.save
+        failed = []
+        def _save(self, *args, **kwargs):
+            if not failed:
+                failed.append(self)
+                raise DatabaseError('Failed to save torrent')
+            return save(self, *args, **kwargs)
+
+        with patch.object(Torrent, 'save', autospec=True, side_effect=_save):
+            self.ptl._add_package_files(torrent, self._package_files(torrent.name, 3))
+
+        # Verify no package files were created and torrent did not advance
+        self.assertEqual(1, len(failed))
+        self.assertEqual(0, PackageFile.objects.filter(torrent=torrent).count())
+        torrent.refresh_from_db()
+        self.assertEqual(0, torrent.package_files_count)
+        self.assertEqual('Error', torrent.stage)
+        self.assertEqual(1, torrent.errors.count())
+
+    def test_get_batch_sentinel(self):
+        torrents = self._create_torrents(2)
+        self.ptl.torrent_queue.put(None)
+
+        # Verify batch stops at sentinel and puts it back
+        self.assertEqual(torrents, self.ptl._get_batch(self.ptl.torrent_queue.get()))
+        self.assertIsNone(self.ptl.torrent_queue.get_nowait())
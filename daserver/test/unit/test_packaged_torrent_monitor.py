@@ -0,0 +1,98 @@
+import json
+
+from mock import patch
+import responses
+
+from dasdaemon.managers import RequestsManager
+from dasdaemon.workers import PackagedTorrentMonitor
+from dasdapi.models import Torrent
+
+import test.common as common
+from test.unit import DaServerUnitTest
+
+
+class PackagedTorrentMonitorUnitTests(DaServerUnitTest):
+
+    def setUp(self):
+        # Get test config with incremental listing
+        self.config = common.load_test_config()
+        self.config['PackagedTorrentMonitor']['incremental'] = 'true'
+        self.url = self.config['PackagedTorrentMonitor']['packaged_torrents_url']
+
+        # Create instance
+        self.rm = RequestsManager(config=self.config)
+        self.ptm = PackagedTorrentMonitor(
+            config=self.config,
+            requests_manager=self.rm
+        )
+
+        # Requests received by mocked server
+        self.requests = []
+
+    def _mock_listing(self, torrents, cursor, etag='"etag"'):
+        """Mock token request and incremental listing of packaged torrents"""
+        common.mock_requests_manager()
+
+        def _callback(request):
+            self.requests.append(request)
+            if request.headers.get('If-None-Match') == etag:
+                return (304, {}, '')
+            return (200, {'ETag': etag}, json.dumps({'torrents': torrents, 'cursor': cursor}))
+
+        responses.add_callback(responses.GET, self.url, callback=_callback)
+
+    @responses.activate
+    def test_get_new_torrents_incremental(self):
+        # Torrent already in database
+        Torrent.objects.create(name='Torrent1', stage=self.ptm.completed_stage())
+        self._mock_listing(['Torrent1', 'Torrent2'], '2026-10-17T17:00:00+00:00')
+
+        # Verify only torrent not in database is new
+        self.assertEqual(set(['Torrent2']), self.ptm._get_new_torrents())
+
+        # Verify cursor and ETag were saved
+        self.assertEqual('2026-10-17T17:00:00+00:00', self.ptm.cursor)
+        self.assertEqual('"etag"', self.ptm.etag)
+        self.assertIn('since=', self.requests[0].url)
+
+    @responses.activate
+    def test_get_new_torrents_incremental_not_modified(self):
+        self._mock_listing(['Torrent1'], '2026-10-17T17:00:00+00:00')
+
+        # Get torrents, then poll again without changes
+        self.assertEqual(set(['Torrent1']), self.ptm._get_new_torrents())
+        self.assertEqual(set(), self.ptm._get_new_torrents())
+
+        # Verify second request sent ETag and cursor was kept
+        self.assertEqual('"etag"', self.requests[1].headers['If-None-Match'])
+        self.assertIn('since=2026-10-17T17', self.requests[1].url)
+        self.assertEqual('2026-10-17T17:00:00+00:00', self.ptm.cursor)
+
+    @responses.activate
+    def test_get_new_torrents_long_poll(self):
+        # Create instance with long poll
+        self.config['PackagedTorrentMonitor']['long_poll'] = 'true'
+        ptm = PackagedTorrentMonitor(
+            config=self.config,
+            requests_manager=self.rm
+        )
+        self.assertEqual(0, ptm._sleep)
+
+        # Mock long poll request
+        common.mock_requests_manager()
+        responses.add(
+            responses.GET, ptm.long_poll_url, status=200, content_type='application/json',
+            body=json.dumps({'torrents': ['Torrent1'], 'cursor': '2026-10-17T17:00:00+00:00'})
+        )
+
+        # Verify torrents and cursor from long poll
+        with patch.object(self.rm.session_pool, 'session', wraps=self.rm.session_pool.session) as mock_session:
+            self.rm.token = 'mocked_token'
+            self.rm._update_token_created()
+            self.assertEqual(set(['Torrent1']), ptm._get_new_torrents())
+        self.assertEqual('2026-10-17T17:00:00+00:00', ptm.cursor)
+        self.assertIn('timeout=20', responses.calls[-1].request.url)
+
+        # Verify long poll did not check out a pooled session
+        mock_session.assert_not_called()
+        self.assertIsNotNone(ptm.long_poll_session)
@@ -1,10 +1,12 @@
-from Queue import Queue
+from Queue import Empty, Queue
+
+from mock import patch
 
 from dasdaemon.managers import (
     DatabaseManager,
     QueueManager
 )
-from dasdaemon.managers.queue_manager import Consumer
+from dasdaemon.managers.queue_manager import Consumer, ConsumerQueue
 from dasdapi.models import PackageFile, Torrent
 
 from test.unit import DaServerUnitTest
@@ -118,6 +120,55 @@ class QueueManagerTorrentConsumerUnitTests(DaServerUnitTest):
             # Verify torrent in database
             self.assertEqual(Torrent.objects.get(id=torrents[i].id).stage, self.consumer1.processing_stage)
 
+    def test_run_one_torrent_consumer_multiple_batches(self):
+        # Use small batches
+        self.qm.batch_size = 2
+
+        # Register consumer and get queue
+        queue = self.qm.register_torrent_consumer(self.consumer1)
+
+        # Add torrents to database
+        num_torrents = 5
+        torrents = _create_torrents(self.consumer1, num_torrents)
+
+        # Run queue manager
+        self._run_qm()
+
+        # Verify all torrents in queue in order
+        self.assertEqual(queue.qsize(), num_torrents)
+        for i in xrange(num_torrents):
+            self.assertEqual(queue.get(), torrents[i])
+
+        # Verify torrents in database
+        self.assertEqual(
+            num_torrents,
+            Torrent.objects.filter(stage=self.consumer1.processing_stage).count()
+        )
+
+    def test_run_torrent_consumer_claims_ready_torrents_only(self):
+        # Register consumer and get queue
+        queue = self.qm.register_torrent_consumer(self.consumer1)
+
+        # Add torrents to database
+        torrents = _create_torrents(self.consumer1, 2)
+
+        # Move torrent out of ready stage after it was selected
+        values_list = self.qm._get_torrents_at_stage(self.consumer1.ready_stage).values_list
+        def _values_list(*args, **kwargs):
+            ids = list(values_list(*args, **kwargs))
+            Torrent.objects.filter(id=torrents[0].id).update(stage='Error')
+            return ids
+
+        with patch('dasdaemon.managers.queue_manager.QueueManager._get_torrents_at_stage') as mock_method:
+            mock_method.return_value.values_list = _values_list
+            mock_method.return_value.model = Torrent
+            self._run_qm()
+
+        # Verify only claimed torrent in queue
+        self.assertEqual(queue.qsize(), 1)
+        self.assertEqual(queue.get(), torrents[1])
+        self.assertEqual(Torrent.objects.get(id=torrents[0].id).stage, 'Error')
+
     def test_run_multiple_different_torrent_consumers_one_torrent(self):
         # Register consumer and get queue
         queue1 = self.qm.register_torrent_consumer(self.consumer1)
@@ -465,3 +516,24 @@ class QueueManagerWithDatabaseManagerUnitTests(DaServerUnitTest):
          # Verify torrent in queue
         self.assertEqual(queue.qsize(), 1)
         self.assertEqual(queue.get(), t_put)
+
+
+class ConsumerQueueUnitTests(DaServerUnitTest):
+
+    def test_get_if(self):
+        queue = ConsumerQueue()
+        for i in xrange(4):
+            queue.put(i)
+
+        # Verify head items are taken while predicate is true
+        self.assertEqual(0, queue.get_if(lambda item: item < 2))
+        self.assertEqual(1, queue.get_if(lambda item: item < 2))
+
+        # Verify head item is left in queue when predicate is false
+        with self.assertRaises(Empty):
+            queue.get_if(lambda item: item < 2)
+        self.assertEqual([2, 3], [queue.get_nowait() for _ in xrange(2)])
+
+        # Verify empty queue raises Empty without calling predicate
+        with self.assertRaises(Empty):
+            queue.get_if(lambda item: self.fail('Predicate called'))
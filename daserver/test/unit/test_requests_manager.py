@@ -0,0 +1,114 @@
+import json
+import threading
+
+import responses
+
+from dasdaemon.managers import RequestsManager
+from dasdaemon.managers.requests_manager import SessionPool
+
+import test.common as common
+from test.unit import DaServerUnitTest
+
+
+class SessionPoolUnitTests(DaServerUnitTest):
+
+    def test_session_reused(self):
+        # Create pool with one session
+        pool = SessionPool(size=1)
+
+        # Check out session twice
+        with pool.session() as session1:
+            pass
+        with pool.session() as session2:
+            pass
+
+        # Verify same session was returned
+        self.assertIs(session1, session2)
+
+    def test_session_expired(self):
+        # Create pool with sessions that expire immediately
+        pool = SessionPool(size=1, max_age_sec=-1)
+
+        # Check out session twice
+        with pool.session() as session1:
+            pass
+        with pool.session() as session2:
+            pass
+
+        # Verify session was replaced
+        self.assertIsNot(session1, session2)
+
+    def test_session_bounded(self):
+        # Create pool with one session
+        pool = SessionPool(size=1)
+        checked_out = threading.Event()
+
+        def _check_out():
+            with pool.session():
+                checked_out.set()
+
+        # Check out session and try to check it out from another thread
+        with pool.session():
+            thread = threading.Thread(target=_check_out)
+            thread.start()
+            thread.join(0.5)
+
+            # Verify other thread is blocked
+            self.assertFalse(checked_out.is_set())
+
+        # Verify other thread got the session after it was returned
+        thread.join()
+        self.assertTrue(checked_out.is_set())
+
+    def test_close(self):
+        # Create pool and check out session
+        pool = SessionPool(size=2)
+        with pool.session() as session1:
+            pass
+
+        # Close pool
+        pool.close()
+
+        # Verify a new session is created
+        with pool.session() as session2:
+            pass
+        self.assertIsNot(session1, session2)
+
+
+class RequestsManagerUnitTests(DaServerUnitTest):
+
+    def setUp(self):
+        # Get test config
+        self.config = common.load_test_config()
+        self.token_url = self.config['RequestsManager']['token_url']
+        self.test_url = self.config['RequestsManager']['test_url']
+
+        # Create requests manager
+        self.rm = RequestsManager(config=self.config)
+
+    def tearDown(self):
+        self.rm.close()
+
+    @responses.activate
+    def test_get_json(self):
+        # Mock token and test requests
+        responses.add(
+            responses.POST, self.token_url,
+            body=json.dumps({'token': 'mocked_token'}), status=200,
+            content_type='application/json'
+        )
+        responses.add(
+            responses.GET, self.test_url,
+            body=json.dumps({'data': 'value'}), status=200,
+            content_type='application/json'
+        )
+
+        # Send request
+        data = self.rm.get_json(self.test_url)
+
+        # Verify response and Authorization header
+        self.assertEqual({'data': 'value'}, data)
+        self.assertEqual(
+            'Token mocked_token',
+            responses.calls[1].request.headers['Authorization']
+        )
@@ -0,0 +1,91 @@
+import json
+from Queue import Queue
+
+import responses
+
+from dasdaemon.managers import RequestsManager
+from dasdaemon.workers import TorrentDeleter, TorrentDeleterPeriodicQueryFunction
+from dasdapi.models import PackageFile, Torrent
+
+import test.common as common
+from test.unit import DaServerUnitTest
+
+
+class TorrentDeleterUnitTests(DaServerUnitTest):
+
+    def setUp(self):
+        # Get test config with small batches
+        self.config = common.load_test_config()
+        self.config['TorrentDeleter']['batch_size'] = '2'
+        self.url = self.config['TorrentDeleter']['delete_url']
+
+        # Create instance
+        self.rm = RequestsManager(config=self.config)
+        self.td = TorrentDeleter(
+            config=self.config,
+            requests_manager=self.rm
+        )
+        self.td.torrent_queue = Queue()
+
+        # Create torrent with package files
+        self.torrent = Torrent.objects.create(
+            name='Torrent',
+            stage=TorrentDeleter.processing_stage(),
+            package_files_count=3
+        )
+        for i in xrange(3):
+            PackageFile.objects.create(
+                filename='Torrent.%04d' % i,
+                torrent=self.torrent,
+                stage='Downloaded'
+            )
+
+        # Filenames received by mocked server
+        self.requests = []
+
+    def _mock_delete(self, status=200):
+        common.mock_requests_manager()
+
+        def _callback(request):
+            filenames = json.loads(request.body)['filenames']
+            self.requests.append(filenames)
+            return (status, {}, json.dumps({'deleted': filenames, 'missing': []}))
+
+        responses.add_callback(responses.DELETE, self.url, callback=_callback)
+
+    def test_TorrentDeleterPeriodicQueryFunction(self):
+        self.torrent.stage = 'Extracted'
+        self.torrent.save()
+
+        TorrentDeleterPeriodicQueryFunction().do_query()
+
+        # Verify torrent moved to ready stage
+        self.torrent.refresh_from_db()
+        self.assertEqual(TorrentDeleter.ready_stage(), self.torrent.stage)
+
+    @responses.activate
+    def test_do_work(self):
+        self._mock_delete()
+        self.td.torrent_queue.put(self.torrent)
+
+        self.td.do_work()
+
+        # Verify package files were deleted in batches
+        self.assertEqual([['Torrent.0000', 'Torrent.0001'], ['Torrent.0002']], self.requests)
+        self.assertEqual(3, PackageFile.objects.filter(stage=TorrentDeleter.package_file_completed_stage()).count())
+
+        # Verify torrent stage
+        self.torrent.refresh_from_db()
+        self.assertEqual(TorrentDeleter.completed_stage(), self.torrent.stage)
+
+    @responses.activate
+    def test_do_work_failed(self):
+        self._mock_delete(status=500)
+        self.td.torrent_queue.put(self.torrent)
+
+        self.td.do_work()
+
+        # Verify no package files were deleted and torrent has error
+        self.assertEqual(0, PackageFile.objects.filter(stage=TorrentDeleter.package_file_completed_stage()).count())
+        self.torrent.refresh_from_db()
+        self.assertEqual('Error', self.torrent.stage)
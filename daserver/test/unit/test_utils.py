@@ -1,3 +1,4 @@
+import io
 import os
 import tarfile
 import tempfile
@@ -234,6 +235,136 @@ class UtilsFsJoinFilesUnitTests(DaServerUnitTest):
         sha256_output = utils.hash.sha256_file(output_file)
         self.assertEqual(sha256_source, sha256_output)
 
+    def test_join_files_single_file_link(self):
+        source_files = ['test-join-files1.bin']
+        sourcefile1 = os.path.join(self.tmpdir, source_files[0])
+        utils.fs.write_random_file(sourcefile1, 12345)
+
+        # Existing output file is replaced by a hard link
+        output_file = os.path.join(self.tmpdir, 'joined.bin')
+        utils.fs.write_random_file(output_file, 10)
+        utils.fs.join_files(output_file, self.tmpdir, source_files, allow_link=True)
+
+        self.assertEqual(12345, os.path.getsize(output_file))
+        self.assertTrue(os.path.samefile(sourcefile1, output_file))
+
+    def test_clone_file_unaligned(self):
+        sourcefile1 = os.path.join(self.tmpdir, 'test-clone-file1.bin')
+        utils.fs.write_random_file(sourcefile1, 10)
+
+        # Output position not block aligned, so nothing is cloned
+        output_file = os.path.join(self.tmpdir, 'cloned.bin')
+        with open(sourcefile1, 'rb') as in_file, open(output_file, 'wb') as out_file:
+            out_file.write(b'x')
+            self.assertFalse(utils.fs.clone_file(in_file, out_file))
+            self.assertEqual(1, out_file.tell())
+        self.assertEqual(1, os.path.getsize(output_file))
+
+
+class UtilsFsCopyFileDataUnitTests(DaServerUnitTest):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+        # Create source file
+        self.source_file = os.path.join(self.tmpdir, 'test-copy-file-data.bin')
+        utils.fs.write_random_file(self.source_file, 12345)
+        with open(self.source_file, 'rb') as in_file:
+            self.contents = in_file.read()
+
+    def tearDown(self):
+        utils.fs.rm_rf(self.tmpdir)
+
+    def test_copy_file_data_count(self):
+        # Copy part of source file between other writes
+        output_file = os.path.join(self.tmpdir, 'output.bin')
+        with open(self.source_file, 'rb') as in_file:
+            with open(output_file, 'wb') as out_file:
+                out_file.write(b'head')
+                in_file.seek(10)
+                copied = utils.fs.copy_file_data(in_file, out_file, 1000, buffer_size=256)
+                out_file.write(b'tail')
+
+                # Verify bytes copied and file positions
+                self.assertEqual(1000, copied)
+                self.assertEqual(1010, in_file.tell())
+
+        # Verify file contents
+        with open(output_file, 'rb') as in_file:
+            self.assertEqual(b'head' + self.contents[10:1010] + b'tail', in_file.read())
+
+    def test_copy_file_data_buffered(self):
+        # Copy to file object without a file descriptor
+        output = io.BytesIO()
+        with open(self.source_file, 'rb') as in_file:
+            copied = utils.fs.copy_file_data(in_file, output, buffer_size=1000)
+
+        # Verify file contents
+        self.assertEqual(len(self.contents), copied)
+        self.assertEqual(self.contents, output.getvalue())
+
+    def test_split_file(self):
+        # Split source file
+        split_files = utils.fs.split_file(self.source_file, self.tmpdir, split_size=5000)
+
+        # Verify split files
+        self.assertEqual(3, len(split_files))
+        contents = b''
+        for split_file in split_files:
+            with open(os.path.join(self.tmpdir, split_file), 'rb') as in_file:
+                contents += in_file.read()
+        self.assertEqual(self.contents, contents)
+
+
+class UtilsFsConcatenatedFileUnitTests(DaServerUnitTest):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+        # Create source files
+        self.source_files = []
+        for i, size in enumerate([12345, 10, 0, 1000]):
+            source_file = os.path.join(self.tmpdir, 'test-concatenated-file%d.bin' % i)
+            utils.fs.write_random_file(source_file, size)
+            self.source_files.append(source_file)
+
+        # Get expected contents
+        self.contents = ''
+        for source_file in self.source_files:
+            with open(source_file, 'rb') as in_file:
+                self.contents += in_file.read()
+
+    def tearDown(self):
+        utils.fs.rm_rf(self.tmpdir)
+
+    def test_read_all(self):
+        # Read all files
+        with utils.fs.ConcatenatedFile(self.source_files) as concatenated_file:
+            contents = concatenated_file.read()
+
+        # Verify contents
+        self.assertEqual(self.contents, contents)
+
+    def test_read_chunks(self):
+        # Read files in chunks that cross file boundaries
+        chunks = []
+        with utils.fs.ConcatenatedFile(self.source_files) as concatenated_file:
+            while True:
+                chunk = concatenated_file.read(4000)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+
+        # Verify chunk sizes and contents
+        for chunk in chunks[:-1]:
+            self.assertEqual(4000, len(chunk))
+        self.assertEqual(self.contents, ''.join(chunks))
+
+    def test_read_empty(self):
+        # Read no files
+        with utils.fs.ConcatenatedFile([]) as concatenated_file:
+            self.assertEqual('', concatenated_file.read(1024))
+
 
 class UtilsHashJoinFilesUnitTests(DaServerUnitTest):
 
@@ -287,3 +418,34 @@ class UtilsHashJoinFilesUnitTests(DaServerUnitTest):
             '2cf24dba5fb0a30e26e83b2ac5b9e29e1b161e5c1fa7425e73043362938b9824',
             utils.hash.sha256_file(tmpfile_path)
         )
+
+    def test_sha256_file_block_sizes(self):
+        # Create temp file larger than the block sizes
+        _, tmpfile_path = tempfile.mkstemp()
+        utils.fs.write_random_file(tmpfile_path, 12345)
+        with open(tmpfile_path, 'rb') as in_file:
+            contents = in_file.read()
+
+        # Verify hash with full and partial blocks
+        for block_size in [1, 4096, 12345, 1024*1024]:
+            self.assertEqual(
+                utils.hash.sha256_bytes(contents),
+                utils.hash.sha256_file(tmpfile_path, block_size=block_size)
+            )
+
+    def test_digest_file(self):
+        # Create temp file
+        _, tmpfile_path = tempfile.mkstemp()
+
+        # Write data to file
+        with open(tmpfile_path, 'wb') as out_file:
+            out_file.write('hello')
+
+        # Verify hashes
+        self.assertEqual(
+            {
+                'md5': '5d41402abc4b2a76b9719d911017c592',
+                'sha256': '2cf24dba5fb0a30e26e83b2ac5b9e29e1b161e5c1fa7425e73043362938b9824'
+            },
+            utils.hash.digest_file(tmpfile_path, block_size=2)
+        )
@@ -17,7 +17,10 @@ from dasdaemon.workers import (
     PackagedTorrentLister,
     PackagedTorrentListerOneTimeQueryFunction,
     PackagedTorrentMonitor,
-    PackageExtractor
+    PackageExtractor,
+    PackageExtractorPeriodicQueryFunction,
+    TorrentDeleter,
+    TorrentDeleterPeriodicQueryFunction
 )
 from dasdaemon.workers.error import ErrorHandlerPeriodicQueryFunction
 
@@ -74,7 +77,9 @@ class WorkerManagerUnitTests(DaServerUnitTest):
         self.assertItemsEqual(
             query_functions, [
                 ErrorHandlerPeriodicQueryFunction,
-                PackageDownloaderPeriodicQueryFunction
+                PackageDownloaderPeriodicQueryFunction,
+                PackageExtractorPeriodicQueryFunction,
+                TorrentDeleterPeriodicQueryFunction
             ]
         )
 
@@ -140,6 +145,7 @@ class WorkerManagerUnitTests(DaServerUnitTest):
                 PackageDownloader,
                 PackagedTorrentLister,
                 PackagedTorrentMonitor,
-                PackageExtractor
+                PackageExtractor,
+                TorrentDeleter
             ]
         )
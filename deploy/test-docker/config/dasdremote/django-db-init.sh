@@ -20,5 +20,6 @@ python manage.py environment-init --profile docker
 # Start dasdremote daemon
 python manage.py dasdremote-daemon --start --pidfile /files/dasdremote-daemon.pid
 
-# Start wsgi server
-gunicorn dasdremote.wsgi -b 0.0.0.0:8000
+# Start wsgi server with threaded workers, so long poll requests do not
+# block other requests. The timeout must stay above the longest wait.
+gunicorn dasdremote.wsgi -b 0.0.0.0:8000 --worker-class gthread --threads 8 --timeout 60